@@ -0,0 +1,377 @@
+import fcntl
+import json
+import os
+import re
+import sys
+import time
+
+
+STATE = os.environ.get("FAKE_PSQL_STATE", "fake_psql_state.json")
+SPAWNS = os.environ.get("FAKE_PSQL_SPAWNS")
+CONNECT_DELAY = float(os.environ.get("FAKE_PSQL_CONNECT_MS", "0")) / 1000
+STMT_DELAY = float(os.environ.get("FAKE_PSQL_STMT_MS", "0")) / 1000
+KEY_RANGE = "1|1000"
+
+_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+_ARRAY = re.compile(r"ARRAY\[(.*?)\]::text\[\]")
+_INCLUDE = re.compile(r"^\\i '((?:[^']|'')*)'$", re.MULTILINE)
+_KEY_BOUNDS = re.compile(r">= (-?\d+) and \S+ < (-?\d+)")
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _literals(text: str) -> list[str]:
+    return [v.replace("''", "'") for v in _LITERAL.findall(text)]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def split_statements(sql: str) -> list[str]:
+    out, buf, i, quote = [], [], 0, None
+    while i < len(sql):
+        if quote:
+            if sql.startswith(quote, i):
+                buf.append(quote)
+                i += len(quote)
+                quote = None
+                continue
+        elif sql[i] == "'":
+            quote = "'"
+        elif sql.startswith("$$", i):
+            quote = "$$"
+            buf.append("$$")
+            i += 2
+            continue
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = len(sql) if end < 0 else end
+            continue
+        elif sql[i] == ";":
+            out.append("".join(buf).strip())
+            buf = []
+            i += 1
+            continue
+        buf.append(sql[i])
+        i += 1
+    out.append("".join(buf).strip())
+    return [s for s in out if s]
+
+
+class FakeDb:
+    def __init__(self, data: dict, quiet: bool = True):
+        self.data = data
+        self.quiet = quiet
+        self.delay = 0.0
+
+    @property
+    def hist(self) -> dict:
+        return self.data["hist"]
+
+    def _key(self, change: str, script: str) -> str:
+        return f"{change}\x00{script}"
+
+    def run(self, stmt: str) -> str | None:
+        low = " ".join(stmt.lower().split())
+        lits = _literals(stmt)
+        arrays = [_literals(a) for a in _ARRAY.findall(stmt)]
+
+        if low.startswith("do") and "upgraded to version" in low:
+            for version in map(int, re.findall(r"upgraded to version (\d+)", low)):
+                if self.data.get("version", 1) < version:
+                    self.data["version"] = version
+                    print(f"NOTICE:  Table sqlapply.sqlapply_history upgraded to version {version}.", file=sys.stderr)
+            return None
+        if low.startswith("do") and "sqlapply" in low and "create" in low:
+            if self.data["init"]:
+                if "create table" in low:
+                    print("NOTICE:  Table sqlapply.sqlapply_history already exists.", file=sys.stderr)
+                elif "create sequence" in low:
+                    print("NOTICE:  Sequence sqlapply.sqlapply_history_seq already exists.", file=sys.stderr)
+                else:
+                    print("NOTICE:  Schema sqlapply already exists.", file=sys.stderr)
+            elif "create table" in low:
+                self.data.update(init=True, version=1)
+            return None
+        if low.startswith("select to_regclass"):
+            version = self.data.get("version", 1) if self.data["init"] else 0
+            comment = f"sqlapply:{version}" if version > 1 else ""
+            print(("t" if self.data["init"] else "f") + f"|{comment}|16.4|fake")
+            return None
+        if "sqlapply." in low and not self.data["init"]:
+            return 'relation "sqlapply.sqlapply_history" does not exist'
+
+        if low.startswith("select pg_try_advisory_lock"):
+            locks = self.data.setdefault("locks", {})
+            holder = locks.get(lits[-1])
+            if holder and holder != os.getpid() and _alive(holder):
+                print("f")
+            else:
+                locks[lits[-1]] = os.getpid()
+                print("t")
+            return None
+        if low.startswith("select min("):
+            print(KEY_RANGE)
+            return None
+        if "from pg_stat_replication" in low:
+            print("0|0")
+            return None
+        if "sqlapply.sqlapply_applied" in low:
+            if self.data.get("version", 1) < 6:
+                return 'relation "sqlapply.sqlapply_applied" does not exist'
+            applied = self.data.setdefault("applied", {})
+            key = self._key(lits[0], lits[1])
+            if low.startswith("select digest"):
+                if applied.get(key):
+                    print(applied[key])
+            elif low.startswith("insert"):
+                applied[key] = lits[2]
+            return None
+        if low.startswith("select script_file, status"):
+            for key, rec in self.hist.items():
+                change, script = key.split("\x00")
+                if change == lits[0]:
+                    print(
+                        f"{script}|{rec['status']}|{rec['src_checksum']}|{rec['t']}|"
+                        f"{rec.get('duration_ms', '')}|{rec.get('stmt_index', 0)}|{rec.get('stmt_hash', '')}|"
+                        f"{rec.get('batch_next', '')}|{rec.get('batch_rows', 0)}"
+                    )
+            return None
+        if low.startswith("select") and "from sqlapply.sqlapply_history" in low:
+            return None
+        if low.startswith("insert into sqlapply.sqlapply_history") and arrays:
+            change, status = lits[0], lits[1]
+            for script, checksum in zip(*arrays[:2]):
+                self.hist[self._key(change, script)] = {"status": status, "src_checksum": checksum, "t": _now()}
+            return None
+        if low.startswith("insert into sqlapply.sqlapply_history"):
+            key = self._key(lits[0], lits[1])
+            if key in self.hist:
+                return "duplicate key value violates unique constraint"
+            self.hist[key] = {"status": lits[2], "src_checksum": lits[3], "t": _now()}
+            return None
+        if low.startswith("update sqlapply.sqlapply_history as h") and "duration_ms" in low:
+            for script, duration, spawn, retries in zip(*arrays[:4]):
+                rec = self.hist.get(self._key(lits[-1], script))
+                if rec:
+                    rec.update(duration_ms=int(duration), spawn_ms=int(spawn), retries=int(retries))
+                    print(f"{script}|{rec.get('exec_ms', '')}")
+            return None
+        if low.startswith("update sqlapply.sqlapply_history as h") and arrays:
+            for script, checksum in zip(*arrays[:2]):
+                rec = self.hist.get(self._key(lits[-1], script))
+                if rec:
+                    rec.update(status=lits[0], src_checksum=checksum)
+            return None
+        if low.startswith("update sqlapply.sqlapply_history") and "batch_next" in low:
+            rec = self.hist.get(self._key(lits[0], lits[1]))
+            if rec:
+                numbers = re.findall(r"batch_(?:next|rows) = (-?\d+)", low)
+                rec.update(batch_next=int(numbers[0]), batch_rows=int(numbers[1]))
+            return None
+        if low.startswith("update sqlapply.sqlapply_history") and "stmt_index" in low:
+            rec = self.hist.get(self._key(lits[1], lits[2]))
+            if rec:
+                rec.update(stmt_index=int(re.search(r"stmt_index = (\d+)", low).group(1)), stmt_hash=lits[0])
+            return None
+        if low.startswith("update sqlapply.sqlapply_history"):
+            status, checksum, change, script = lits[:4]
+            rec = self.hist.get(self._key(change, script))
+            if rec:
+                rec.update(status=status, src_checksum=checksum)
+                if "exec_ms" in low:
+                    rec["exec_ms"] = int(self.delay * 1000)
+            return None
+        if low.startswith(("alter table", "comment on")):
+            return None
+        if low.startswith("copy") and "from stdin" in low:
+            rows = sum(1 for _ in sys.stdin.buffer) - (1 if "header true" in low else 0)
+            if "fake_error" in low:
+                return 'relation "fake_error" does not exist'
+            print(f"COPY {max(rows, 0)}")
+            return None
+
+        self.delay += STMT_DELAY
+        if "fake_error" in low:
+            return 'relation "fake_error" does not exist'
+        if not self.quiet and low.startswith(("update", "delete")):
+            bounds = _KEY_BOUNDS.search(low)
+            rows = int(bounds.group(2)) - int(bounds.group(1)) if bounds else 1
+            print(f"{low.split()[0].upper()} {rows}")
+        return None
+
+
+def execute(dbname: str, sql: str, echo: bool, quiet: bool = True, single: bool = False) -> str | None:
+    with open(STATE + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(STATE, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+
+        data = state.setdefault(dbname, {"init": False, "hist": {}})
+        snapshot = json.dumps(data)
+        db = FakeDb(data, quiet)
+        error = None
+        in_transaction = single
+
+        for stmt in split_statements(sql):
+            if echo:
+                print(stmt + ";")
+            low = stmt.lower()
+            if low in ("begin", "start transaction"):
+                in_transaction = True
+                continue
+            if low in ("commit", "end"):
+                in_transaction = False
+                continue
+            if low == "rollback":
+                state[dbname] = json.loads(snapshot)
+                data = state[dbname]
+                db = FakeDb(data, quiet)
+                in_transaction = False
+                continue
+            error = db.run(stmt)
+            if error:
+                print(f"psql:{dbname}: ERROR:  {error}", file=sys.stderr)
+                if in_transaction:
+                    state[dbname] = json.loads(snapshot)
+                break
+
+        with open(STATE, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    time.sleep(db.delay)
+    sys.stdout.flush()
+    return error
+
+
+def _swap_db(dbname: str, data: dict | None = None) -> dict:
+    with open(STATE + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(STATE, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        current = state.setdefault(dbname, {"init": False, "hist": {}})
+        if data is not None:
+            state[dbname] = data
+            with open(STATE, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+    return current
+
+
+def session(dbname: str):
+    variables: dict[str, str] = {}
+    buf: list[str] = []
+    tx: dict | None = None
+
+    def _fail(message: str):
+        print(f"psql:{dbname}: ERROR:  {message}", file=sys.stderr, flush=True)
+        variables["LAST_ERROR_SQLSTATE"] = "42P01"
+        if tx is not None:
+            tx["aborted"] = True
+
+    def _run(text: str):
+        nonlocal tx
+        for stmt in split_statements(text):
+            low = stmt.lower()
+            if low in ("begin", "start transaction"):
+                tx = {"snapshot": _swap_db(dbname), "aborted": False}
+            elif low in ("commit", "end", "rollback"):
+                if tx is not None and (tx["aborted"] or low == "rollback"):
+                    _swap_db(dbname, tx["snapshot"])
+                tx = None
+            elif tx is not None and tx["aborted"]:
+                _fail("current transaction is aborted, commands ignored until end of transaction block")
+            elif execute(dbname, stmt, echo=False, quiet=variables.get("QUIET", "on") != "off"):
+                variables["LAST_ERROR_SQLSTATE"] = "42P01"
+                if tx is not None:
+                    tx["aborted"] = True
+
+    def _feed(line: str) -> bool:
+        nonlocal buf
+        if line.startswith("\\"):
+            command, _, rest = line[1:].partition(" ")
+            rest = re.sub(r":(\w+)", lambda m: variables.get(m.group(1), m.group(0)), rest)
+            if command == "set":
+                name, _, value = rest.partition(" ")
+                variables[name] = value
+            elif command == "echo":
+                print(rest, flush=True)
+            elif command == "warn":
+                print(rest, file=sys.stderr, flush=True)
+            elif command == "q":
+                return False
+            elif command == "i":
+                with open(_literals(rest)[0], encoding="utf-8") as f:
+                    for included in f:
+                        _feed(included.rstrip("\n"))
+            return True
+
+        buf.append(re.sub(r"(?<!:):(\w+)", lambda m: variables.get(m.group(1), m.group(0)), line))
+        text = "\n".join(buf)
+        if text.strip().endswith(";") and not text.count("$$") % 2:
+            buf = []
+            _run(text)
+        return True
+
+    for line in sys.stdin:
+        if not _feed(line.rstrip("\n")):
+            return
+
+
+def _read_file(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    def _include(m: re.Match) -> str:
+        return _read_file(m.group(1).replace("''", "'")).rstrip().rstrip(";") + ";"
+
+    return _INCLUDE.sub(_include, text)
+
+
+def main():
+    args = sys.argv[1:]
+    url = next(a for a in args if a.startswith("postgresql:"))
+    dbname = url.split("?")[0].rsplit("/", 1)[1]
+
+    sql = None
+    if "-c" in args:
+        sql = ";\n".join(args[i + 1] for i, a in enumerate(args) if a == "-c")
+    elif "-f" in args:
+        sql = _read_file(args[args.index("-f") + 1])
+
+    if SPAWNS:
+        with open(SPAWNS, "a", encoding="utf-8") as f:
+            f.write(dbname + "\n")
+
+    time.sleep(CONNECT_DELAY)
+    if dbname.startswith("down"):
+        print('psql: error: connection to server at "fake", port 5432 failed: Connection refused', file=sys.stderr)
+        sys.exit(2)
+
+    if sql is None:
+        session(dbname)
+        return
+
+    error = execute(
+        dbname, sql, echo=any(a.startswith("-e") for a in args), single="-1" in args,
+    )
+    if error:
+        sys.exit(3 if "-f" in args else 1)
+
+
+if __name__ == "__main__":
+    main()
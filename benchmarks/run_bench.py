@@ -0,0 +1,233 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from contextlib import redirect_stdout
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sqlapply.config import load_config
+from sqlapply.core import SQLApplyTool, load_scripts
+from sqlapply.executor import connections
+from sqlapply.history import SCHEMA_VERSION
+from sqlapply.models import ExecMode, ForceMode
+from sqlapply.profile import PROFILER
+
+
+CHANGE_NAME = "bench"
+FAKE_PSQL = Path(__file__).resolve().parent / "fake_psql.py"
+
+
+def _script_body(index: int, size: int, fail: bool) -> str:
+    lines = [f"-- synthetic script {index}"]
+    if fail:
+        lines.append("SELECT * FROM fake_error;")
+    row = 0
+    while sum(len(line) + 1 for line in lines) < size:
+        lines.append(f"INSERT INTO bench_{index} (id, payload) VALUES ({row}, '{'x' * 48}');")
+        row += 1
+    return "\n".join(lines) + "\n"
+
+
+def build_workspace(args: argparse.Namespace, work: Path) -> tuple[Path, dict]:
+    rng = random.Random(args.seed)
+    changes_dir = work / "changes"
+    logs_dir = work / "logs"
+    bin_dir = work / "bin"
+    for d in (changes_dir, logs_dir, bin_dir):
+        d.mkdir(parents=True)
+
+    wrapper = bin_dir / "psql"
+    wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_PSQL}" "$@"\n', encoding="utf-8")
+    wrapper.chmod(0o755)
+
+    config_path = work / "sqlapply.conf"
+    sections = [
+        "[DEFAULT]",
+        f"logging_level = {args.logging_level}",
+        f"logs_dir = {logs_dir}",
+        f"changes_dir = {changes_dir}",
+        "",
+    ]
+
+    state: dict = {}
+    counts = {"new": 0, "applied": 0, "failed": 0}
+    for d in range(args.databases):
+        dbname = f"bench_db{d + 1}"
+        db_dir = changes_dir / CHANGE_NAME / dbname
+        db_dir.mkdir(parents=True)
+        sections += [f"[{dbname}]", "host = local", f"dbname = {dbname}", ""]
+
+        hist: dict = {}
+        for s in range(args.scripts):
+            roll = rng.random()
+            kind = "applied" if roll < args.applied else "failed" if roll < args.applied + args.failed else "new"
+            counts[kind] += 1
+            (db_dir / f"{s + 1:04d}_script.sql").write_text(
+                _script_body(s, args.script_size, kind == "failed"), encoding="utf-8",
+            )
+            if kind != "new":
+                hist[f"{s + 1:04d}_script.sql"] = {"status": "SUCCESS" if kind == "applied" else "SCRIPT_ERROR"}
+
+        for script in load_scripts(str(db_dir)):
+            if script.name in hist:
+                hist[script.name].update(src_checksum=script.checksum, t="2024-01-01 00:00:00")
+        state[dbname] = {
+            "init": True,
+            "version": SCHEMA_VERSION,
+            "hist": {f"{CHANGE_NAME}\x00{name}": rec for name, rec in hist.items()},
+        }
+
+    config_path.write_text("\n".join(sections), encoding="utf-8")
+    return config_path, {"state": state, "counts": counts, "bin_dir": bin_dir}
+
+
+def _rss_kb(who: int) -> int:
+    return resource.getrusage(who).ru_maxrss
+
+
+def _spawns(path: Path) -> int:
+    if not path.exists():
+        return 0
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+
+def run_phase(name: str, action, spawns_path: Path) -> dict:
+    PROFILER.reset()
+    spawns_before = _spawns(spawns_path)
+    started = time.perf_counter()
+    cpu_before = os.times()
+    error = None
+    try:
+        with redirect_stdout(io.StringIO()):
+            action()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - started
+    cpu_after = os.times()
+
+    phase = {
+        "phase": name,
+        "wall_s": round(wall, 4),
+        "cpu_user_s": round(cpu_after.user - cpu_before.user, 4),
+        "cpu_system_s": round(cpu_after.system - cpu_before.system, 4),
+        "spawns": _spawns(spawns_path) - spawns_before,
+        "overhead_s": {k: round(v, 4) for k, v in PROFILER.overhead.items()},
+        "overhead_calls": dict(PROFILER.calls),
+        "databases_s": {k: round(v, 4) for k, v in PROFILER.databases.items()},
+        "scripts": len(PROFILER.scripts),
+        "scripts_s": round(sum(t.duration for t in PROFILER.scripts), 4),
+    }
+    if error:
+        phase["error"] = error
+    return phase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sqlapply overhead benchmark against a fake psql")
+    parser.add_argument("-n", "--databases", type=int, default=4, help="Number of databases")
+    parser.add_argument("-m", "--scripts", type=int, default=50, help="Scripts per database")
+    parser.add_argument("--script-size", type=int, default=4096, help="Approximate script size in bytes")
+    parser.add_argument("--applied", type=float, default=0.5, help="Fraction of scripts already applied")
+    parser.add_argument("--failed", type=float, default=0.0, help="Fraction of scripts that previously failed")
+    parser.add_argument("--connect-ms", type=float, default=0, help="Simulated connection latency")
+    parser.add_argument("--stmt-ms", type=float, default=0, help="Simulated latency per user statement")
+    parser.add_argument("-P", "--parallel", type=int, default=1)
+    parser.add_argument("--script-parallelism", type=int, default=1)
+    parser.add_argument(
+        "--mode", choices=[m.value for m in ExecMode], default=ExecMode.SINGLE_TRANSACTION.value,
+    )
+    parser.add_argument("-f", "--force", choices=["ALL", "ERROR", "MD5DIFF"])
+    parser.add_argument("--phases", default="show,check,execute", help="Comma separated phases to run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--logging-level", default="WARNING")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated workspace")
+    parser.add_argument("-o", "--output", help="Write the JSON report to a file")
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="sqlapply_bench_"))
+    try:
+        config_path, workspace = build_workspace(args, work)
+        state_path = work / "fake_psql_state.json"
+        spawns_path = work / "spawns.log"
+        state_path.write_text(json.dumps(workspace["state"]), encoding="utf-8")
+
+        os.environ["PATH"] = f"{workspace['bin_dir']}{os.pathsep}{os.environ['PATH']}"
+        os.environ["FAKE_PSQL_STATE"] = str(state_path)
+        os.environ["FAKE_PSQL_SPAWNS"] = str(spawns_path)
+        os.environ["FAKE_PSQL_CONNECT_MS"] = str(args.connect_ms)
+        os.environ["FAKE_PSQL_STMT_MS"] = str(args.stmt_ms)
+
+        started = time.perf_counter()
+        config = load_config(str(config_path))
+        tool = SQLApplyTool(config)
+        force = ForceMode(args.force.lower()) if args.force else None
+        exec_mode = ExecMode(args.mode)
+
+        def _execute(dry_run: bool):
+            tool.execute_change(
+                change_name=CHANGE_NAME,
+                exec_mode=exec_mode,
+                force_mode=force,
+                dry_run=dry_run,
+                parallel=args.parallel,
+                script_parallelism=args.script_parallelism,
+            )
+
+        actions = {
+            "show": lambda: tool.show_change(CHANGE_NAME),
+            "check": lambda: _execute(True),
+            "execute": lambda: _execute(False),
+        }
+
+        phases = []
+        with connections():
+            for name in args.phases.split(","):
+                name = name.strip()
+                if name not in actions:
+                    parser.error(f"Unknown phase '{name}'")
+                phases.append(run_phase(name, actions[name], spawns_path))
+        logging.shutdown()
+
+        report = {
+            "commit": subprocess.run(
+                ["git", "-C", str(ROOT), "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True,
+            ).stdout.strip(),
+            "python": platform.python_version(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "keep")},
+            "scripts": workspace["counts"],
+            "wall_s": round(time.perf_counter() - started, 4),
+            "spawns": _spawns(spawns_path),
+            "peak_rss_kb": _rss_kb(resource.RUSAGE_SELF),
+            "peak_child_rss_kb": _rss_kb(resource.RUSAGE_CHILDREN),
+            "phases": phases,
+        }
+    finally:
+        if args.keep:
+            print(f"Workspace kept in {work}", file=sys.stderr)
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,14 @@ import argparse
 import logging
 import sys
 
+from pathlib import Path
+
 from .config import load_config
 from .core import SQLApplyTool
 from .models import ExecMode, ForceMode
 from .history import SQLApplyError
+from .executor import connections
+from .server import SQLApplyServer, request_remote
 
 
 def main():
@@ -24,48 +28,143 @@ def main():
     parser.add_argument("-C", "--config", type=str, help="Path to config file")
     parser.add_argument(
         "-m", "--mode", type=str,
-        choices=["single-transaction", "on-error-stop"],
+        choices=[mode.value for mode in ExecMode],
         default="single-transaction",
         help="Execution mode (default: single-transaction)",
     )
+    parser.add_argument("-P", "--parallel", type=int, default=1, help="Number of databases executed concurrently")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop all databases after the first failure")
+    parser.add_argument(
+        "--canary", type=int, default=0,
+        help="Apply to the first N targets of every fleet before the rest",
+    )
+    parser.add_argument(
+        "--script-parallelism", type=int, default=1,
+        help="Number of independent scripts executed concurrently in one database",
+    )
+
+    parser.add_argument("-w", "--watch", action="store_true", help="Apply new and changed scripts as files are saved")
+    parser.add_argument(
+        "--debounce", type=float, default=0.1,
+        help="Seconds without file events before a watch iteration starts (default: 0.1)",
+    )
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived server on a Unix socket")
+    parser.add_argument(
+        "--socket", type=str,
+        help="Server socket path; without --serve, send the request to a running server",
+    )
+    parser.add_argument("--status", action="store_true", help="Show the state of a running server")
+
+    parser.add_argument("--verify-cache", action="store_true", help="Rehash all scripts ignoring the checksum cache")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Print slowest scripts, time per database and sqlapply overhead after execution",
+    )
 
     args = parser.parse_args()
 
-    try:
-        config = load_config(args.config)
-        tool = SQLApplyTool(config)
+    if args.parallel < 1:
+        parser.error("--parallel must be a positive integer")
+    if args.script_parallelism < 1:
+        parser.error("--script-parallelism must be a positive integer")
+    if args.canary < 0:
+        parser.error("--canary must be a non-negative integer")
+    if args.debounce < 0:
+        parser.error("--debounce must be a non-negative number")
+    if args.watch and (args.show or args.check or args.init or args.serve or args.socket):
+        parser.error("--watch cannot be combined with --show, --check, --init, --serve or --socket")
+    if args.status and not args.socket:
+        parser.error("--status needs --socket")
 
+    if args.socket and not args.serve:
         if args.init:
-            tool.init_dbs(
-                target_db=args.dbname,
-                change_name=args.change_name,
-            )
+            parser.error("--init is not available through --socket")
+        if not args.change_name and not args.status:
+            parser.print_help()
             return
+        request = {
+            "action": "status" if args.status else "show" if args.show else "check" if args.check else "apply",
+            "change": args.change_name,
+            "mode": args.mode,
+            "pattern": args.pattern,
+            "force": args.force,
+            "parallel": args.parallel,
+            "script_parallelism": args.script_parallelism,
+            "fail_fast": args.fail_fast,
+            "canary": args.canary,
+            "profile": args.profile,
+            "verify_cache": args.verify_cache,
+        }
+        try:
+            ok = request_remote(Path(args.socket), request)
+        except SQLApplyError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0 if ok else 1)
 
-        if not args.change_name:
-            parser.print_help()
+    try:
+        if args.serve:
+            config = load_config(args.config)
+            socket_path = Path(args.socket) if args.socket else config.logs_dir / "sqlapply.sock"
+            SQLApplyServer(config, socket_path).serve_forever()
             return
 
-        force = ForceMode(args.force.lower()) if args.force else None
-        exec_mode = ExecMode(args.mode)
-
-        if args.show:
-            tool.show_change(args.change_name, args.pattern)
-        elif args.check:
-            tool.execute_change(
-                change_name=args.change_name,
-                exec_mode=exec_mode,
-                pattern=args.pattern,
-                force_mode=force,
-                dry_run=True,
-            )
-        else:
-            tool.execute_change(
-                change_name=args.change_name,
-                exec_mode=exec_mode,
-                pattern=args.pattern,
-                force_mode=force,
-            )
+        config = load_config(args.config)
+        tool = SQLApplyTool(config)
+
+        with connections():
+            if args.init:
+                tool.init_dbs(
+                    target_db=args.dbname,
+                    change_name=args.change_name,
+                )
+                return
+
+            if not args.change_name:
+                parser.print_help()
+                return
+
+            force = ForceMode(args.force.lower()) if args.force else None
+            exec_mode = ExecMode(args.mode)
+            ok = True
+
+            if args.show:
+                tool.show_change(args.change_name, args.pattern)
+            elif args.watch:
+                tool.watch_change(
+                    change_name=args.change_name,
+                    exec_mode=exec_mode,
+                    pattern=args.pattern,
+                    force_mode=force,
+                    script_parallelism=args.script_parallelism,
+                    debounce=args.debounce,
+                )
+            elif args.check:
+                ok = tool.execute_change(
+                    change_name=args.change_name,
+                    exec_mode=exec_mode,
+                    pattern=args.pattern,
+                    force_mode=force,
+                    dry_run=True,
+                    parallel=args.parallel,
+                    script_parallelism=args.script_parallelism,
+                    verify_cache=args.verify_cache,
+                )
+            else:
+                ok = tool.execute_change(
+                    change_name=args.change_name,
+                    exec_mode=exec_mode,
+                    pattern=args.pattern,
+                    force_mode=force,
+                    parallel=args.parallel,
+                    script_parallelism=args.script_parallelism,
+                    verify_cache=args.verify_cache,
+                    fail_fast=args.fail_fast,
+                    profile=args.profile,
+                    canary=args.canary,
+                )
+            if not ok:
+                sys.exit(1)
 
     except SQLApplyError as e:
         logging.critical(str(e))
@@ -0,0 +1,95 @@
+import json
+import logging
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from statistics import median
+
+from .models import HistoryRecord, PsqlResult, ScriptState
+
+
+MAX_SAMPLES = 20
+MIN_WATCH_SECONDS = 1.0
+
+
+class RunRecordStore:
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self, change_name: str) -> dict[tuple[str, str], list[float]]:
+        samples: dict[tuple[str, str], list[float]] = {}
+        if not self.path.exists():
+            return samples
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("change") == change_name and record.get("status") == "SUCCESS":
+                        key = (record.get("section", record.get("db")), record["script"])
+                        samples.setdefault(key, []).append(record["duration"])
+        except OSError as e:
+            logging.warning(f"Run records '{self.path}' are unreadable: {e}")
+
+        return {key: durations[-MAX_SAMPLES:] for key, durations in samples.items()}
+
+    def append(self, change_name: str, dbname: str, section: str, results: dict[str, PsqlResult]):
+        if not results:
+            return
+
+        ts = datetime.now().isoformat(timespec="seconds")
+        lines = "".join(json.dumps({
+            "ts": ts,
+            "change": change_name,
+            "db": dbname,
+            "section": section,
+            "script": name,
+            "status": result.status.value,
+            "duration": round(result.duration, 3),
+        }) + "\n" for name, result in results.items())
+
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class Baselines:
+    def __init__(self, samples: dict[tuple[str, str], list[float]] | None = None):
+        self._samples = samples or {}
+
+    def expected(self, section: str, script_name: str, record: HistoryRecord | None = None) -> float | None:
+        samples = list(self._samples.get((section, script_name), []))
+        if record and record.state == ScriptState.APPLIED and record.duration_ms is not None:
+            samples.append(record.duration_ms / 1000)
+        return median(samples) if samples else None
+
+
+@contextmanager
+def _watch(label: str, baseline: float, factor: float):
+    started = time.perf_counter()
+
+    def _warn():
+        logging.warning(
+            f"'{label}' is running for {time.perf_counter() - started:.1f}s, "
+            f"over {factor:g}x its baseline of {baseline:.3f}s"
+        )
+
+    timer = threading.Timer(max(baseline * factor, MIN_WATCH_SECONDS), _warn)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    finally:
+        timer.cancel()
+
+
+def watchdog(label: str, baseline: float | None, factor: float):
+    if baseline is None:
+        return nullcontext()
+    return _watch(label, baseline, factor)
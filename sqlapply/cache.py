@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .models import Script
+
+
+class ChecksumCache:
+    def __init__(self, path: Path, verify: bool = False, workers: int = 8):
+        self.path = path
+        self.verify = verify
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: dict[str, list] = {}
+
+        if path.exists():
+            try:
+                self._entries = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                logging.warning(f"Checksum cache '{path}' is unreadable, rebuilding")
+
+    @staticmethod
+    def _stamp(st: os.stat_result) -> list[int]:
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def lookup(self, path: Path) -> str | None:
+        if self.verify:
+            return None
+        entry = self._entries.get(str(path.resolve()))
+        if entry and entry[:3] == self._stamp(path.stat()):
+            return entry[3]
+        return None
+
+    def store(self, path: Path, st: os.stat_result, checksum: str):
+        with self._lock:
+            self._entries[str(path.resolve())] = self._stamp(st) + [checksum]
+            self._dirty = True
+
+    def fill(self, scripts: list[Script]):
+        misses = []
+        for script in scripts:
+            checksum = self.lookup(script.path)
+            if checksum is None:
+                misses.append(script)
+            else:
+                script.checksum = checksum
+
+        def _hash(script: Script):
+            st = script.path.stat()
+            self.store(script.path, st, script.checksum)
+
+        if misses:
+            logging.debug(f"Hashing {len(misses)} script(s) missing from checksum cache")
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(_hash, misses))
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                tmp.write_text(json.dumps(self._entries), encoding="utf-8")
+                os.replace(tmp, self.path)
+                self._dirty = False
+            except OSError as e:
+                tmp.unlink(missing_ok=True)
+                logging.warning(f"Failed to write checksum cache '{self.path}': {e}")
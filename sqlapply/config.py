@@ -1,10 +1,16 @@
 import configparser
 import logging
+import re
 import sys
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 
 
+TIMEOUT_RE = re.compile(r"^\d+(us|ms|s|min|h|d)?$")
+_TIMEOUT_UNITS = {"us": 1e-6, "ms": 1e-3, "s": 1.0, "min": 60.0, "h": 3600.0, "d": 86400.0}
+_RANGE_RE = re.compile(r"\{(\d+)\.\.(\d+)\}")
+
+
 @dataclass
 class DbConfig:
     dbname: str
@@ -12,6 +18,15 @@ class DbConfig:
     port: int = 5432
     user: str = "postgres"
     password: str = ""
+    backend: str = "psql"
+    connect_timeout: int = 10
+    lock_timeout: str = ""
+    statement_timeout: str = ""
+    lock_retries: int = 0
+    lock_retry_delay: float = 1.0
+    max_replica_lag: float = 0.0
+    max_active_backends: int = 0
+    throttle_poll: float = 5.0
 
 
 @dataclass
@@ -21,6 +36,12 @@ class Config:
     core_dir: Path = field(default_factory=lambda: Path(__file__).resolve().parent)
     logs_dir: Path = field(default_factory=lambda: Path(__file__).resolve().parent.parent / "logs")
     changes_dir: Path = field(default_factory=lambda: Path(__file__).resolve().parent.parent / "changes")
+    output_tail_lines: int = 200
+    baseline_factor: float = 2.0
+    fleets: dict[str, list[str]] = field(default_factory=dict)
+
+    def targets(self, name: str) -> list[str]:
+        return self.fleets.get(name, [name])
 
     def get_db(self, name: str) -> DbConfig:
         if name in self.databases:
@@ -29,6 +50,51 @@ class Config:
         return DbConfig(dbname=name)
 
 
+def timeout_seconds(value: str) -> float:
+    m = TIMEOUT_RE.match(value)
+    if not m:
+        raise ValueError(f"invalid duration '{value}'")
+    return int(value[:m.start(1)] if m.group(1) else value) * _TIMEOUT_UNITS[m.group(1) or "ms"]
+
+
+def expand_ranges(text: str) -> list[str]:
+    m = _RANGE_RE.search(text)
+    if not m:
+        return [text]
+
+    first, last = m.group(1), m.group(2)
+    padded = any(len(v) > 1 and v.startswith("0") for v in (first, last))
+    width = max(len(first), len(last)) if padded else 0
+    step = 1 if int(last) >= int(first) else -1
+    head, tail = text[:m.start()], text[m.end():]
+    return [
+        head + str(n).zfill(width) + rest
+        for n in range(int(first), int(last) + step, step)
+        for rest in expand_ranges(tail)
+    ]
+
+
+def expand_fleet(spec: str, base: DbConfig) -> dict[str, DbConfig]:
+    targets: dict[str, DbConfig] = {}
+    for entry in re.split(r"[,\s]+", spec.strip()):
+        for item in expand_ranges(entry):
+            address, _, dbname = item.rpartition("/")
+            host, _, port = address.partition(":")
+            if not dbname or (port and not port.isdigit()):
+                raise ValueError(f"invalid fleet target '{item}'")
+
+            name = f"{dbname}@{host}" if host else dbname
+            if name in targets:
+                raise ValueError(f"duplicate fleet target '{name}'")
+            targets[name] = replace(
+                base,
+                dbname=dbname,
+                host=host or base.host,
+                port=int(port) if port else base.port,
+            )
+    return targets
+
+
 def load_config(config_path: str | None = None) -> Config:
     if config_path is None:
         config_path = str(Path(__file__).resolve().parent.parent / "sqlapply.conf")
@@ -70,6 +136,20 @@ def load_config(config_path: str | None = None) -> Config:
         changes_dir=Path(defaults.get("changes_dir", str(Path(__file__).resolve().parent.parent / "changes"))),
     )
 
+    tail_str = defaults.get("output_tail_lines", "200")
+    if not tail_str.isdigit() or int(tail_str) < 1:
+        logging.critical("'output_tail_lines' must be a positive integer")
+        sys.exit(1)
+    config.output_tail_lines = int(tail_str)
+
+    try:
+        config.baseline_factor = float(defaults.get("baseline_factor", "2.0"))
+    except ValueError:
+        config.baseline_factor = 0.0
+    if config.baseline_factor < 1:
+        logging.critical("'baseline_factor' must be a number not less than 1")
+        sys.exit(1)
+
     for section in parser.sections():
         sec = parser[section]
         port_str = sec.get("port", "5432")
@@ -77,12 +157,85 @@ def load_config(config_path: str | None = None) -> Config:
             logging.critical(f"(Database '{section}') Port must be an integer")
             sys.exit(1)
 
-        config.databases[section] = DbConfig(
+        backend = sec.get("backend", "psql")
+        if backend not in ("psql", "native"):
+            logging.critical(f"(Database '{section}') Backend must be 'psql' or 'native'")
+            sys.exit(1)
+
+        timeout_str = sec.get("connect_timeout", "10")
+        if not timeout_str.isdigit():
+            logging.critical(f"(Database '{section}') Connect timeout must be an integer")
+            sys.exit(1)
+
+        lock_timeout = sec.get("lock_timeout", "")
+        statement_timeout = sec.get("statement_timeout", "")
+        for name, value in (("lock_timeout", lock_timeout), ("statement_timeout", statement_timeout)):
+            if value and not TIMEOUT_RE.match(value):
+                logging.critical(f"(Database '{section}') '{name}' must be a duration like 5s or 500ms")
+                sys.exit(1)
+
+        retries_str = sec.get("lock_retries", "0")
+        if not retries_str.isdigit():
+            logging.critical(f"(Database '{section}') 'lock_retries' must be an integer")
+            sys.exit(1)
+
+        try:
+            retry_delay = float(sec.get("lock_retry_delay", "1.0"))
+        except ValueError:
+            retry_delay = -1.0
+        if retry_delay < 0:
+            logging.critical(f"(Database '{section}') 'lock_retry_delay' must be a non-negative number")
+            sys.exit(1)
+
+        try:
+            max_replica_lag = float(sec.get("max_replica_lag", "0"))
+            throttle_poll = float(sec.get("throttle_poll", "5"))
+        except ValueError:
+            max_replica_lag = throttle_poll = -1.0
+        if max_replica_lag < 0 or throttle_poll <= 0:
+            logging.critical(
+                f"(Database '{section}') 'max_replica_lag' must be a non-negative number "
+                "and 'throttle_poll' a positive number"
+            )
+            sys.exit(1)
+
+        backends_str = sec.get("max_active_backends", "0")
+        if not backends_str.isdigit():
+            logging.critical(f"(Database '{section}') 'max_active_backends' must be an integer")
+            sys.exit(1)
+
+        db = DbConfig(
             dbname=sec.get("dbname", section),
             host=sec.get("host", "localhost"),
             port=int(port_str),
             user=sec.get("user", "postgres"),
             password=sec.get("password", ""),
+            backend=backend,
+            connect_timeout=int(timeout_str),
+            lock_timeout=lock_timeout,
+            statement_timeout=statement_timeout,
+            lock_retries=int(retries_str),
+            lock_retry_delay=retry_delay,
+            max_replica_lag=max_replica_lag,
+            max_active_backends=int(backends_str),
+            throttle_poll=throttle_poll,
         )
 
+        fleet = sec.get("fleet", "")
+        if not fleet:
+            config.databases[section] = db
+            continue
+
+        try:
+            targets = expand_fleet(fleet, db)
+        except ValueError as e:
+            logging.critical(f"(Database '{section}') {e}")
+            sys.exit(1)
+        clash = next((name for name in targets if name in parser or name in config.databases), None)
+        if clash:
+            logging.critical(f"(Database '{section}') fleet target '{clash}' clashes with another database")
+            sys.exit(1)
+        config.databases.update(targets)
+        config.fleets[section] = list(targets)
+
     return config
@@ -1,26 +1,65 @@
 import logging
 import os
+import random
 import re
 import signal
 import pathlib
+import threading
+import time
 
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from functools import lru_cache
-from hashlib import md5
+from typing import Callable
 
+from .baseline import Baselines, RunRecordStore, watchdog
+from .cache import ChecksumCache
 from .config import Config, DbConfig
-from .models import Script, ScriptState, ExecMode, ForceMode
-from .psql import exec_file
+from .models import DbRun, HistoryRecord, PsqlResult, Script, ScriptState, ExecMode, ForceMode
+from .executor import get_executor
+from .psql import STDERR, CaptureSink, FileSink
 from .history import (
     SQLApplyError,
+    ChangeLock,
     init_db,
     check_db,
-    get_script_state,
-    get_src_hash,
-    insert_record,
+    preflight,
+    load_history,
+    applied_digests,
+    set_applied_digest,
+    exec_recorded,
+    exec_checkpointed,
+    exec_batched,
+    exec_copied,
+    is_lock_timeout,
+    probe_load,
+    insert_records,
     update_record,
+    update_records,
+    update_timings,
 )
+from .datafiles import COPY_CONFIG, copy_sql, load_copy_config, matches_pattern, open_data
 from .display import CSNode, CSTree
+from .manifest import ChangeManifest
+from .plan import build_graph, build_waves, contract_graph, critical_path, read_batch_spec, read_lock_policy
+from .profile import PROFILER, ScriptTiming
+from .splitter import SplitCache, statement_hash
+from .throttle import LoadProbe, Throttle
+from .watch import open_watcher
+
+
+_log_context = threading.local()
+_COPY_TAG = re.compile(r"^COPY (\d+)$", re.MULTILINE)
+LOCK_RETRY_MAX_DELAY = 60.0
+ERROR_TAIL_LINES = 5
+WATCH_DEBOUNCE = 0.1
+
+
+class DbLogFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        dbname = getattr(_log_context, "dbname", None)
+        record.db_prefix = f"[{dbname}] " if dbname else ""
+        return True
 
 
 @lru_cache(maxsize=1000)
@@ -36,25 +75,39 @@ def _natural_key(s: str) -> list[tuple[int, int | str]]:
     return key
 
 
-def load_scripts(directory: str, pattern: str = "*.sql") -> list[Script]:
+def load_scripts(
+    directory: str,
+    pattern: str = "*.sql",
+    cache: ChecksumCache | None = None,
+) -> list[Script]:
     dir_path = pathlib.Path(directory)
+    copies = load_copy_config(dir_path)
+    excluded = {COPY_CONFIG, *copies}
     scripts = []
     for f in dir_path.glob(pattern):
-        if f.is_file():
-            scripts.append(Script(
-                name=f.name,
-                content=f.read_text(encoding="utf-8"),
-                path=f,
-            ))
+        if f.is_file() and f.name not in excluded:
+            scripts.append(Script(name=f.name, path=f))
+    for name, spec in copies.items():
+        f = dir_path / name
+        if not matches_pattern(name, pattern):
+            continue
+        if not f.is_file():
+            raise SQLApplyError(f"Data file '{f}' listed in {COPY_CONFIG} not found")
+        scripts.append(Script(name=name, path=f, copy=spec))
     scripts.sort(key=lambda s: _natural_key(s.name))
+    if cache is not None:
+        cache.fill(scripts)
     return scripts
 
 
 class SQLApplyTool:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, load_probe: LoadProbe = probe_load, keep_cache: bool = False):
         self.config = config
+        self.load_probe = load_probe
         self._stop = False
+        self._splits = SplitCache(config.logs_dir / "split_cache")
         self._setup_logging()
+        self._cache = ChecksumCache(config.logs_dir / "checksum_cache.json") if keep_cache else None
 
     def _setup_logging(self):
         logs_dir = self.config.logs_dir
@@ -64,31 +117,30 @@ class SQLApplyTool:
 
         log_file = logs_dir / f"log_{datetime.now():%Y-%m-%d}.log"
 
+        handlers = [
+            logging.FileHandler(log_file, encoding="utf-8", mode="a"),
+            logging.StreamHandler(),
+        ]
+        for handler in handlers:
+            handler.addFilter(DbLogFilter())
+
         logging.basicConfig(
             level=getattr(logging, self.config.logging_level, logging.INFO),
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.FileHandler(log_file, encoding="utf-8", mode="a"),
-                logging.StreamHandler(),
-            ],
+            format="%(asctime)s - %(levelname)s - %(db_prefix)s%(message)s",
+            handlers=handlers,
         )
 
-    def _log_execution(
+    def _execution_log(
         self,
         script_name: str,
         change_name: str,
         dbname: str,
-        output: str,
-    ) -> str:
+    ) -> FileSink:
         safe_name = script_name.replace("/", "_")
         filename = f"{dbname}_{change_name}_{safe_name}.log"
         path = self.config.logs_dir / "execution_logs" / filename
 
-        entry = f"-- LOG OF {datetime.now():%Y-%m-%d %H:%M:%S}\n{output}\n"
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(entry)
-
-        return str(path)
+        return FileSink(path, header=f"-- LOG OF {datetime.now():%Y-%m-%d %H:%M:%S}")
 
     def init_dbs(self, target_db: str, change_name: str | None = None):
         if target_db == "ALL":
@@ -101,15 +153,23 @@ class SQLApplyTool:
                 raise SQLApplyError(f"Change folder not found: {change_path}")
 
             logging.info(f"Initializing all databases in change '{change_name}'")
-            for entry in change_path.iterdir():
-                if entry.is_dir():
-                    db = self.config.get_db(entry.name)
-                    check_db(db, check_init=False)
-                    init_db(db)
+            dbs = {
+                name: self.config.get_db(name)
+                for e in change_path.iterdir() if e.is_dir()
+                for name in self.config.targets(e.name)
+            }
+            preflight(dbs, check_init=False)
+            for db in dbs.values():
+                init_db(db, self.config.output_tail_lines)
+        elif target_db in self.config.fleets:
+            dbs = {name: self.config.get_db(name) for name in self.config.targets(target_db)}
+            preflight(dbs, check_init=False)
+            for db in dbs.values():
+                init_db(db, self.config.output_tail_lines)
         else:
             db = self.config.get_db(target_db)
             check_db(db, check_init=False)
-            init_db(db)
+            init_db(db, self.config.output_tail_lines)
 
     def show_change(self, change_name: str, pattern: str = "*.sql"):
         change_path = self.config.changes_dir / change_name
@@ -121,28 +181,34 @@ class SQLApplyTool:
         for entry in sorted(change_path.iterdir()):
             if not entry.is_dir():
                 continue
-            db = self.config.get_db(entry.name)
             scripts = load_scripts(str(entry), pattern)
-            db_node = CSNode(f"DB '{entry.name}' ({db.host}:{db.port})", color="cyan")
+            if entry.name in self.config.fleets:
+                db_node = CSNode(
+                    f"DB '{entry.name}' (fleet of {len(self.config.fleets[entry.name])} targets)", color="cyan",
+                )
+            else:
+                db = self.config.get_db(entry.name)
+                db_node = CSNode(f"DB '{entry.name}' ({db.host}:{db.port})", color="cyan")
             for s in scripts:
-                db_node.add(CSNode(s.name))
+                db_node.add(CSNode(f"{s.name} -> COPY {s.copy.table}" if s.copy else s.name))
             root.add(db_node)
 
         CSTree(root).display()
 
     @staticmethod
     def _script_hash(script: Script) -> str:
-        return md5(script.content.encode("utf-8")).hexdigest()
+        return script.checksum
 
     def _should_execute(
         self,
         script: Script,
         force_mode: ForceMode | None,
-        db: DbConfig,
-        change_name: str,
+        record: HistoryRecord | None,
         dry_run: bool,
+        run: DbRun,
     ) -> bool:
         state = script.state
+        last_hash = record.src_checksum if record else None
 
         if state == ScriptState.NEW:
             if dry_run:
@@ -151,7 +217,6 @@ class SQLApplyTool:
 
         if state == ScriptState.APPLIED:
             src_hash = self._script_hash(script)
-            last_hash = get_src_hash(db, change_name, script.name)
             hash_changed = last_hash and last_hash != src_hash
 
             if force_mode == ForceMode.ALL:
@@ -175,7 +240,7 @@ class SQLApplyTool:
             if not dry_run:
                 msg += " (use --force ALL or --force ERROR)"
             logging.error(msg)
-            self._stop = True
+            run.stop = True
             return False
 
         if state == ScriptState.IN_PROGRESS:
@@ -188,7 +253,6 @@ class SQLApplyTool:
                 return True
 
             src_hash = self._script_hash(script)
-            last_hash = get_src_hash(db, change_name, script.name)
             if last_hash and last_hash != src_hash and force_mode == ForceMode.MD5DIFF:
                 return True
 
@@ -203,83 +267,618 @@ class SQLApplyTool:
         pattern: str = "*.sql",
         force_mode: ForceMode | None = None,
         dry_run: bool = False,
-    ):
+        parallel: int = 1,
+        fail_fast: bool = False,
+        script_parallelism: int = 1,
+        verify_cache: bool = False,
+        profile: bool = False,
+        canary: int = 0,
+    ) -> bool:
         change_path = self.config.changes_dir / change_name
         if not change_path.exists():
             raise SQLApplyError(f"Change folder not found: {change_path}")
 
-        signal.signal(signal.SIGINT, lambda _s, _f: self._set_stop())
+        self._stop = False
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, lambda _s, _f: self.stop())
+        PROFILER.reset()
 
         db_dirs = sorted(e for e in change_path.iterdir() if e.is_dir())
-
-        for d in db_dirs:
-            check_db(self.config.get_db(d.name))
+        targets = {name: d for d in db_dirs for name in self.config.targets(d.name)}
+        fleet_of = {name: d.name for name, d in targets.items() if d.name in self.config.fleets}
 
         logging.info(f"Finding files on pattern '{pattern}'...")
 
-        for db_dir in db_dirs:
-            dbname = db_dir.name
-            db = self.config.get_db(dbname)
-            scripts = load_scripts(str(db_dir), pattern)
+        manifest = ChangeManifest(change_path)
+        current = {}
+        if force_mode != ForceMode.ALL:
+            current = {name: digest for name, d in targets.items() if (digest := manifest.digest(d, pattern))}
+        applied = applied_digests({name: self.config.get_db(name) for name in current}, change_name)
+        up_to_date = {name for name, digest in current.items() if applied.get(name) == digest}
 
-            logging.info(f"Executing scripts on db '{dbname}' (Total: {len(scripts)})")
-            logging.debug(
-                "\n".join(f"- [{i + 1}] {s.name}" for i, s in enumerate(scripts))
-            )
+        runs = [DbRun(name=name) for name in targets]
+        for run in runs:
+            if run.name in up_to_date:
+                run.skipped = manifest.count(targets[run.name])
+                logging.info(f"Change '{change_name}' in db '{run.name}' is up to date (digest {current[run.name][:12]})")
 
-            for script in scripts:
-                script.state = get_script_state(db, change_name, script.name)
-                if script.state == ScriptState.NEW and not dry_run:
-                    insert_record(db, change_name, script.name, self._script_hash(script))
+        preflight({name: self.config.get_db(name) for name in targets if name not in up_to_date})
 
-            for script in scripts:
-                if self._stop and not dry_run:
-                    update_record(
-                        db, change_name, script.name,
-                        "EXECUTION_STOPPED", self._script_hash(script),
+        if self._cache is not None and not verify_cache:
+            cache = self._cache
+        else:
+            cache = ChecksumCache(self.config.logs_dir / "checksum_cache.json", verify=verify_cache)
+        store = RunRecordStore(self.config.logs_dir / "run_records.jsonl")
+        baselines = Baselines(store.load(change_name))
+        fail_fast = fail_fast or parallel <= 1
+        started_runs: set[str] = set(up_to_date)
+        progress = {section: [0, 0] for section in set(fleet_of.values())}
+        for name in up_to_date & fleet_of.keys():
+            progress[fleet_of[name]][0] += 1
+        progress_lock = threading.Lock()
+
+        def _worker(run: DbRun):
+            started_runs.add(run.name)
+            if parallel > 1:
+                _log_context.dbname = run.name
+            started = time.perf_counter()
+            lock = None if dry_run else ChangeLock(self.config.get_db(run.name), change_name)
+            try:
+                if lock is None or lock.acquire():
+                    self._execute_db(
+                        run, targets[run.name], change_name, exec_mode, pattern,
+                        force_mode, dry_run, script_parallelism, cache, baselines,
+                        manifest=manifest, locked=lock is not None,
                     )
-                    continue
+                else:
+                    run.locked_out = True
+                    logging.warning(f"Change '{change_name}' in db '{run.name}' is claimed by another runner, skipping")
+            finally:
+                if lock is not None:
+                    lock.release()
+                _log_context.dbname = None
+                PROFILER.add_database(run.name, time.perf_counter() - started)
+            if run.stop and fail_fast:
+                self._stop = True
+            section = fleet_of.get(run.name)
+            if section and not dry_run:
+                with progress_lock:
+                    progress[section][0] += 1
+                    progress[section][1] += run.stop
+                    done, failed = progress[section]
+                total = len(self.config.fleets[section])
+                logging.info(f"Fleet '{section}': {done}/{total} targets done, {failed} failed")
+
+        def _run_all(batch: list[DbRun]):
+            if parallel > 1:
+                with ThreadPoolExecutor(max_workers=parallel) as pool:
+                    for future in [pool.submit(_worker, run) for run in batch]:
+                        future.result()
+            else:
+                for run in batch:
+                    _worker(run)
+
+        canaries = set()
+        if canary and not dry_run:
+            canaries = {name for section in progress for name in self.config.fleets[section][:canary]}
+
+        try:
+            runs_left = [run for run in runs if run.name not in up_to_date]
+            rest = [run for run in runs_left if run.name not in canaries]
+            if canaries:
+                logging.info(f"Running canary targets first: {', '.join(sorted(canaries))}")
+                _run_all([run for run in runs_left if run.name in canaries])
+                failed = [run.name for run in runs if run.name in canaries and run.stop]
+                if failed:
+                    logging.error(f"Canary failed on {', '.join(failed)}, the rest of the fleet is not started")
+                    self._stop = True
+                    rest = [run for run in rest if run.name not in fleet_of]
+            _run_all(rest)
+        finally:
+            cache.save()
+            manifest.save()
+            for run in runs:
+                store.append(change_name, run.name, targets[run.name].name, run.timings)
+
+        if not dry_run and len(runs) > 1:
+            logging.info("Summary:")
+            for run in runs:
+                if run.name in started_runs and not (run.name in fleet_of and not run.stop):
+                    log_fn = logging.error if run.stop or run.locked_out else logging.info
+                    log_fn(f"- {run.summary()}")
+            for section in sorted(progress):
+                members = [run for run in runs if fleet_of.get(run.name) == section]
+                failed = [run.name for run in members if run.stop]
+                pending = [run.name for run in members if run.name not in started_runs]
+                claimed = [run.name for run in members if run.locked_out]
+                succeeded = len(members) - len(failed) - len(pending) - len(claimed)
+                text = f"- fleet '{section}': {succeeded}/{len(members)} succeeded"
+                if failed:
+                    text += f", failed: {', '.join(failed)}"
+                if claimed:
+                    text += f", claimed by other runners: {len(claimed)}"
+                if pending:
+                    text += f", not started: {len(pending)}"
+                (logging.error if failed or pending else logging.info)(text)
+
+        if profile and not dry_run:
+            PROFILER.log_report()
+
+        locked_out = [run.name for run in runs if run.locked_out]
+        completed = not self._stop and not locked_out and not any(run.stop for run in runs)
+        if completed:
+            logging.info("Executing change completed")
+        elif locked_out and not self._stop and not any(run.stop for run in runs):
+            logging.error(f"Executing change not completed, claimed by other runners: {', '.join(locked_out)}")
+        return completed
 
-                should = self._should_execute(script, force_mode, db, change_name, dry_run)
+    def watch_change(
+        self,
+        change_name: str,
+        exec_mode: ExecMode = ExecMode.SINGLE_TRANSACTION,
+        pattern: str = "*.sql",
+        force_mode: ForceMode | None = None,
+        script_parallelism: int = 1,
+        debounce: float = WATCH_DEBOUNCE,
+    ):
+        change_path = self.config.changes_dir / change_name
+        if not change_path.exists():
+            raise SQLApplyError(f"Change folder not found: {change_path}")
 
-                if dry_run:
-                    if should and script.state != ScriptState.NEW:
-                        logging.info(f"'{script.name}' will be re-executed")
-                    continue
+        self._stop = False
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, lambda _s, _f: self.stop())
+
+        cache = self._cache or ChecksumCache(self.config.logs_dir / "checksum_cache.json")
+        known: dict[str, dict[str, HistoryRecord]] = {}
+        locks: dict[str, ChangeLock] = {}
+        dirty: set[str] | None = None
+
+        try:
+            with open_watcher(change_path) as watcher:
+                while not self._stop:
+                    started = time.perf_counter()
+                    db_dirs = sorted(
+                        e for e in change_path.iterdir()
+                        if e.is_dir() and (dirty is None or e.name in dirty)
+                    )
+                    targets = {name: d for d in db_dirs for name in self.config.targets(d.name)}
+                    fresh = {name: self.config.get_db(name) for name in targets if name not in locks}
+                    try:
+                        preflight(fresh)
+                    except SQLApplyError as e:
+                        logging.error(str(e))
+                        targets = {name: d for name, d in targets.items() if name in locks}
+
+                    for name in fresh.keys() & targets.keys():
+                        lock = ChangeLock(fresh[name], change_name)
+                        if lock.acquire():
+                            locks[name] = lock
+                            set_applied_digest(fresh[name], change_name, name, "")
+                        else:
+                            logging.warning(f"Change '{change_name}' in db '{name}' is claimed by another runner, skipping")
+
+                    for name, db_dir in targets.items():
+                        if self._stop or name not in locks:
+                            continue
+                        try:
+                            self._execute_db(
+                                DbRun(name=name), db_dir, change_name, exec_mode, pattern, force_mode,
+                                False, script_parallelism, cache, None, known, locked=True,
+                            )
+                        except SQLApplyError as e:
+                            logging.error(str(e))
+                            known.pop(name, None)
+                    cache.save()
+
+                    if dirty is not None:
+                        logging.info(f"Applied changes in {time.perf_counter() - started:.3f}s")
+                    logging.info(f"Watching '{change_path}' for changes (Ctrl+C to stop)")
+                    dirty = watcher.wait(debounce, lambda: self._stop)
+                    if dirty:
+                        logging.info(f"Changed: {', '.join(sorted(dirty))}")
+        finally:
+            for lock in locks.values():
+                lock.release()
+
+    def _execute_db(
+        self,
+        run: DbRun,
+        db_dir: pathlib.Path,
+        change_name: str,
+        exec_mode: ExecMode,
+        pattern: str,
+        force_mode: ForceMode | None,
+        dry_run: bool,
+        script_parallelism: int = 1,
+        cache: ChecksumCache | None = None,
+        baselines: Baselines | None = None,
+        known: dict[str, dict[str, HistoryRecord]] | None = None,
+        manifest: ChangeManifest | None = None,
+        locked: bool = False,
+    ):
+        dbname = run.name
+        db = self.config.get_db(dbname)
+        if manifest is not None:
+            manifest.digest(db_dir, pattern)
+        scripts = load_scripts(str(db_dir), pattern, cache)
+        digest = manifest.update(db_dir, pattern, scripts) if manifest is not None else None
+
+        logging.info(f"Executing scripts on db '{dbname}' (Total: {len(scripts)})")
+        logging.debug(
+            "\n".join(f"- [{i + 1}] {s.name}" for i, s in enumerate(scripts))
+        )
 
-                if not should:
-                    continue
+        graph = build_graph(scripts)
+        if known is not None and dbname in known:
+            history = known[dbname]
+        else:
+            history = load_history(db, change_name)
+            if known is not None:
+                known[dbname] = history
+
+        for script in scripts:
+            record = history.get(script.name)
+            script.state = record.state if record else ScriptState.NEW
+
+        stale = [s for s in scripts if s.state == ScriptState.IN_PROGRESS] if locked else []
+        if stale:
+            logging.warning(
+                f"Reclaiming {len(stale)} in-progress script(s) left by a runner that is gone: "
+                + ", ".join(s.name for s in stale)
+            )
+            update_records(db, change_name, "EXECUTION_STOPPED", [(s.name, self._script_hash(s)) for s in stale])
+            for script in stale:
+                script.state = ScriptState.STOPPED
+
+        if not dry_run:
+            insert_records(db, change_name, [
+                (s.name, self._script_hash(s)) for s in scripts if s.state == ScriptState.NEW
+            ])
+
+        unchanged: set[str] = set()
+        if force_mode != ForceMode.ALL:
+            unchanged = {
+                s.name for s in scripts
+                if s.state == ScriptState.APPLIED and history[s.name].src_checksum == self._script_hash(s)
+            }
+        pending = [s for s in scripts if s.name not in unchanged]
+        if unchanged:
+            run.skipped += len(unchanged)
+            logging.info(f"{len(unchanged)} of {len(scripts)} scripts already applied and unchanged, skipping")
+            graph = contract_graph(graph, unchanged)
+
+        throttle = None if dry_run else Throttle(db, self.load_probe)
+
+        def _process(script: Script):
+            record = history.get(script.name)
+            self._process_script(
+                run, db, script, record,
+                change_name, exec_mode, force_mode, dry_run,
+                baselines.expected(db_dir.name, script.name, record) if baselines else None,
+                throttle,
+            )
+
+        self._run_scripts(pending, graph, script_parallelism, _process)
+
+        if run.stopped:
+            stopped = set(run.stopped)
+            update_records(db, change_name, "EXECUTION_STOPPED", [
+                (s.name, self._script_hash(s)) for s in scripts if s.name in stopped
+            ])
+
+        if run.timings:
+            exec_times = update_timings(db, change_name, run.timings)
+            for name, result in run.timings.items():
+                PROFILER.add_script(ScriptTiming(
+                    dbname=run.name,
+                    script=name,
+                    duration=result.duration,
+                    spawn=result.spawn_time,
+                    sql=exec_times.get(name),
+                ))
+
+        if dry_run and pending:
+            msg = f"Expected runtime on '{dbname}': ~{run.expected:.3f}s"
+            if run.unestimated:
+                msg += f" ({run.unestimated} scripts without baseline)"
+            logging.info(msg)
+            waves = build_waves(graph)
+            path = critical_path(graph)
+            logging.info(f"Execution waves: {len(waves)} (critical path: {len(path)} scripts)")
+            for i, wave in enumerate(waves):
+                logging.info(f"- wave {i + 1}: {', '.join(wave)}")
+            logging.debug(f"Critical path: {' -> '.join(path)}")
+
+        if self._stop:
+            run.stop = True
+
+        if digest is not None and not dry_run:
+            if run.stop:
+                set_applied_digest(db, change_name, dbname, "")
+            elif all(s.name in unchanged or (s.name in run.timings and run.timings[s.name].ok) for s in scripts):
+                set_applied_digest(db, change_name, dbname, digest)
+
+        if known is not None:
+            if run.stop:
+                known.pop(dbname, None)
+            else:
+                hashes = {s.name: self._script_hash(s) for s in scripts}
+                for name, result in run.timings.items():
+                    history[name] = HistoryRecord(
+                        status=result.status.value,
+                        src_checksum=hashes[name],
+                        execution_time=f"{datetime.now():%Y-%m-%d %H:%M:%S}",
+                        duration_ms=int(result.duration * 1000),
+                    )
 
-                result = exec_file(db=db, path=str(script.path), args=exec_mode.psql_args)
+        if not dry_run:
+            if run.stop:
+                logging.error(f"Error executing change in db '{dbname}'")
+            elif run.paused:
+                logging.info(f"Executing change in db '{db.dbname}' completed (throttled {run.paused:.1f}s)")
+            else:
+                logging.info(f"Executing change in db '{db.dbname}' completed")
 
-                update_record(
+    def _process_script(
+        self,
+        run: DbRun,
+        db: DbConfig,
+        script: Script,
+        record: HistoryRecord | None,
+        change_name: str,
+        exec_mode: ExecMode,
+        force_mode: ForceMode | None,
+        dry_run: bool,
+        expected: float | None = None,
+        throttle: Throttle | None = None,
+    ):
+        if (run.stop or self._stop) and not dry_run:
+            run.stopped.append(script.name)
+            return
+
+        should = self._should_execute(script, force_mode, record, dry_run, run)
+
+        statements: list[str] = []
+        start = 0
+        if should and exec_mode == ExecMode.STATEMENT and script.copy is None:
+            statements = self._splits.get(script)
+            start = self._resume_point(record, statements, force_mode)
+            if start is None:
+                logging.error(
+                    f"'{script.name}' changed before its checkpoint (statement {record.stmt_index}), "
+                    "cannot resume (use --force ALL to restart it)"
+                )
+                if not dry_run:
+                    run.failed.append(script.name)
+                run.stop = True
+                return
+            if start:
+                logging.info(f"'{script.name}' resumes from statement {start + 1} of {len(statements)}")
+
+        spec = None
+        resume = None
+        if should and exec_mode == ExecMode.BATCHED and script.copy is None:
+            try:
+                spec = read_batch_spec(script)
+                if spec is None:
+                    raise SQLApplyError(
+                        f"'{script.name}' has no batch header "
+                        "(-- sqlapply: batch table=<table> key=<column> size=<rows> sleep=<seconds>)"
+                    )
+            except SQLApplyError as e:
+                logging.error(str(e))
+                if not dry_run:
+                    run.failed.append(script.name)
+                run.stop = True
+                return
+            resume = self._batch_resume(record, force_mode)
+            msg = f"'{script.name}' runs in batches of {spec.size} over {spec.table}.{spec.key}"
+            if resume:
+                msg += f", resuming from {spec.key} >= {resume[0]} ({resume[1]} rows done)"
+            logging.info(msg)
+
+        policy = None
+        if should:
+            try:
+                policy = read_lock_policy(script, db)
+            except SQLApplyError as e:
+                logging.error(str(e))
+                if not dry_run:
+                    run.failed.append(script.name)
+                run.stop = True
+                return
+
+        if dry_run:
+            if should and script.state != ScriptState.NEW:
+                logging.info(f"'{script.name}' will be re-executed")
+            if should and script.copy:
+                logging.info(f"'{script.name}' will be loaded into {script.copy.table}")
+            if should:
+                if expected is None:
+                    run.unestimated += 1
+                else:
+                    run.expected += expected
+                    logging.info(f"'{script.name}' expected runtime ~{expected:.3f}s")
+            return
+
+        if not should:
+            run.skipped += 1
+            return
+
+        if throttle is not None:
+            self._throttle(throttle, f"'{script.name}'", run)
+            if run.stop or self._stop:
+                run.stopped.append(script.name)
+                return
+
+        log = self._execution_log(script.name, change_name, run.name)
+        sinks = [
+            log,
+            CaptureSink(maxlen=self.config.output_tail_lines),
+        ]
+        recorded = exec_mode == ExecMode.SINGLE_TRANSACTION or script.copy is not None
+        options = policy.pg_options
+
+        def _attempt() -> tuple[PsqlResult, bool]:
+            if script.copy:
+                with open_data(script.path) as source:
+                    return exec_copied(
+                        db, change_name, script.name,
+                        self._script_hash(script), copy_sql(script.copy), source, sinks, options,
+                    ), True
+            if exec_mode == ExecMode.SINGLE_TRANSACTION:
+                return exec_recorded(
                     db, change_name, script.name,
-                    result.status.value, self._script_hash(script),
+                    self._script_hash(script), script.path, exec_mode.psql_args, sinks, options,
+                ), True
+            if exec_mode == ExecMode.STATEMENT:
+                return exec_checkpointed(db, change_name, script.name, statements, start, sinks, options), True
+            if exec_mode == ExecMode.BATCHED:
+                return exec_batched(
+                    db, change_name, script.name, script.path, spec, resume, sinks,
+                    should_stop=lambda: run.stop or self._stop, options=options,
+                    pause=lambda: self._throttle(throttle, f"the next batch of '{script.name}'", run),
                 )
+            return get_executor(db).exec_file(
+                db=db, path=str(script.path), args=exec_mode.psql_args, sinks=sinks, options=options,
+            ), True
+
+        try:
+            with watchdog(f"{run.name}/{script.name}", expected, self.config.baseline_factor):
+                result, done = _attempt()
+                retries = 0
+                while recorded and retries < policy.retries and is_lock_timeout(result):
+                    retries += 1
+                    delay = self._backoff(policy.retry_delay, retries)
+                    msg = f"'{script.name}' hit a lock timeout, retry {retries}/{policy.retries} in {delay:.1f}s"
+                    logging.warning(msg)
+                    log.write(STDERR, f"-- sqlapply: {msg}")
+                    if not self._sleep(delay, run):
+                        break
+                    result, done = _attempt()
+                result.retries = retries
+        finally:
+            log.close()
+        run.timings[script.name] = result
+
+        if not done and result.ok:
+            update_record(db, change_name, script.name, "EXECUTION_STOPPED", self._script_hash(script))
+            logging.warning(f"'{script.name}' interrupted between batches, the next run resumes it")
+            run.stop = True
+            return
+
+        if not recorded or not result.ok:
+            update_record(
+                db, change_name, script.name,
+                result.status.value, self._script_hash(script),
+            )
 
-                log_path = self._log_execution(script.name, change_name, dbname, result.combined)
+        if not result.ok:
+            logging.error(
+                f"Error executing '{run.name}/{script.name}'\n"
+                + "".join(f"{line}\n" for line in result.tail(ERROR_TAIL_LINES))
+                + f"Execution log: '{result.log_path}'"
+            )
+            run.failed.append(script.name)
+            run.stop = True
+        else:
+            run.executed += 1
+            msg = f"'{script.name}' successfully executed in {result.duration:.3f}s"
+            if result.retries:
+                msg += f" after {result.retries} lock timeout retries"
+            if script.copy and (m := _COPY_TAG.search(result.stdout)):
+                msg += f" ({m.group(1)} rows loaded)"
+            if force_mode:
+                msg += f" (forcing '{force_mode.value}')"
+            logging.info(msg)
+
+    def _throttle(self, throttle: Throttle | None, label: str, run: DbRun):
+        if throttle is not None:
+            run.paused += throttle.wait(label, lambda: run.stop or self._stop)
 
-                if not result.ok:
-                    logging.error(
-                        f"Error executing '{dbname}/{script.name}'\n"
-                        f"Execution log: '{log_path}'"
-                    )
-                    self._stop = True
-                else:
-                    msg = f"'{script.name}' successfully executed"
-                    if force_mode:
-                        msg += f" (forcing '{force_mode.value}')"
-                    logging.info(msg)
+    @staticmethod
+    def _backoff(base: float, attempt: int) -> float:
+        delay = min(LOCK_RETRY_MAX_DELAY, base * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _sleep(self, seconds: float, run: DbRun) -> bool:
+        deadline = time.monotonic() + seconds
+        while not (run.stop or self._stop):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 0.2))
+        return False
 
-            if not dry_run:
-                if self._stop:
-                    logging.error(f"Error executing change in db '{dbname}'")
-                else:
-                    logging.info(f"Executing change in db '{db.dbname}' completed")
+    @staticmethod
+    def _resume_point(
+        record: HistoryRecord | None,
+        statements: list[str],
+        force_mode: ForceMode | None,
+    ) -> int | None:
+        if not record or not record.stmt_index or force_mode == ForceMode.ALL:
+            return 0
+        if record.state == ScriptState.APPLIED:
+            return 0
+        index = record.stmt_index
+        if index <= len(statements) and statement_hash(statements[index - 1]) == record.stmt_hash:
+            return index
+        return None
 
-        if not self._stop:
-            logging.info("Executing change completed")
+    @staticmethod
+    def _batch_resume(record: HistoryRecord | None, force_mode: ForceMode | None) -> tuple[int, int] | None:
+        if not record or record.batch_next is None or force_mode == ForceMode.ALL:
+            return None
+        if record.state == ScriptState.APPLIED:
+            return None
+        return record.batch_next, record.batch_rows
 
-    def _set_stop(self):
-        logging.info("Process interruption by user")
+    @staticmethod
+    def _run_scripts(
+        scripts: list[Script],
+        graph: dict[str, list[str]],
+        parallelism: int,
+        process: Callable[[Script], None],
+    ):
+        by_name = {s.name: s for s in scripts}
+        position = {s.name: i for i, s in enumerate(scripts)}
+        pending = {s.name: set(graph[s.name]) for s in scripts}
+        finished: set[str] = set()
+
+        def _ready() -> list[str]:
+            return sorted((n for n, deps in pending.items() if deps <= finished), key=position.get)
+
+        if parallelism <= 1:
+            while pending:
+                name = _ready()[0]
+                del pending[name]
+                process(by_name[name])
+                finished.add(name)
+            return
+
+        dbname = getattr(_log_context, "dbname", None)
+
+        def _task(script: Script) -> str:
+            _log_context.dbname = dbname
+            try:
+                process(script)
+            finally:
+                _log_context.dbname = None
+            return script.name
+
+        with ThreadPoolExecutor(max_workers=parallelism) as pool:
+            running: dict[Future, str] = {}
+            while pending or running:
+                for name in _ready()[:parallelism - len(running)]:
+                    del pending[name]
+                    running[pool.submit(_task, by_name[name])] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    finished.add(future.result())
+
+    def stop(self):
+        if not self._stop:
+            logging.info("Process interruption by user")
         self._stop = True
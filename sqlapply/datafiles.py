@@ -0,0 +1,93 @@
+import configparser
+import gzip
+import re
+
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import BinaryIO
+
+from .models import CopySpec
+from .history import SQLApplyError
+from .executor import quote_literal
+from .plan import _IDENTIFIER_RE
+
+
+COPY_CONFIG = "copy.conf"
+
+_FORMATS = {".csv": "csv", ".tsv": "text", ".txt": "text"}
+_ENCODING_RE = re.compile(r"^[\w-]+$")
+
+
+def _format_for(name: str) -> str | None:
+    stem = name[:-3] if name.endswith(".gz") else name
+    return _FORMATS.get(Path(stem).suffix.lower())
+
+
+def matches_pattern(name: str, pattern: str) -> bool:
+    stem = name[:-3] if name.endswith(".gz") else name
+    return fnmatch(name, pattern) or fnmatch(f"{Path(stem).stem}.sql", pattern)
+
+
+def load_copy_config(directory: Path) -> dict[str, CopySpec]:
+    path = directory / COPY_CONFIG
+    if not path.is_file():
+        return {}
+
+    parser = configparser.ConfigParser(default_section="__defaults__", interpolation=None)
+    try:
+        parser.read(path, encoding="utf-8")
+    except configparser.Error as e:
+        raise SQLApplyError(f"Invalid copy config '{path}': {e}")
+
+    specs: dict[str, CopySpec] = {}
+    for name in parser.sections():
+        sec = parser[name]
+        table = sec.get("table", "")
+        columns = [c.strip() for c in sec.get("columns", "").split(",") if c.strip()]
+        fmt = sec.get("format", _format_for(name) or "")
+        encoding = sec.get("encoding", "UTF8")
+        depends = sec.get("depends-on")
+
+        if not _IDENTIFIER_RE.match(table):
+            raise SQLApplyError(f"'{path}' [{name}]: 'table' must be a table name")
+        if any(not _IDENTIFIER_RE.match(c) for c in columns):
+            raise SQLApplyError(f"'{path}' [{name}]: 'columns' must be a comma separated list of column names")
+        if fmt not in ("csv", "text"):
+            raise SQLApplyError(f"'{path}' [{name}]: 'format' must be 'csv' or 'text'")
+        if not _ENCODING_RE.match(encoding):
+            raise SQLApplyError(f"'{path}' [{name}]: invalid 'encoding'")
+        try:
+            header = sec.getboolean("header", fallback=False)
+        except ValueError:
+            raise SQLApplyError(f"'{path}' [{name}]: 'header' must be a boolean")
+
+        specs[name] = CopySpec(
+            table=table,
+            columns=columns,
+            format=fmt,
+            header=header,
+            delimiter=sec.get("delimiter"),
+            null=sec.get("null"),
+            encoding=encoding,
+            depends=[d for d in re.split(r"[,\s]+", depends) if d] if depends is not None else None,
+        )
+    return specs
+
+
+def copy_sql(spec: CopySpec) -> str:
+    options = [f"FORMAT {spec.format}", f"ENCODING {quote_literal(spec.encoding)}"]
+    if spec.header and spec.format == "csv":
+        options.append("HEADER true")
+    if spec.delimiter is not None:
+        options.append(f"DELIMITER {quote_literal(spec.delimiter.encode().decode('unicode_escape'))}")
+    if spec.null is not None:
+        options.append(f"NULL {quote_literal(spec.null)}")
+
+    columns = f" ({', '.join(spec.columns)})" if spec.columns else ""
+    return f"COPY {spec.table}{columns} FROM STDIN WITH ({', '.join(options)})"
+
+
+def open_data(path: Path) -> BinaryIO:
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
@@ -0,0 +1,206 @@
+import re
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+
+from .config import DbConfig
+from .models import PsqlResult
+from . import psql
+
+
+_PLACEHOLDER = re.compile(r"'%(\w+)'|%(\w+)")
+
+
+def quote_literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _array_literal(values: list[str]) -> str:
+    return "ARRAY[" + ", ".join(quote_literal(v) for v in values) + "]::text[]"
+
+
+def render_literal(template: str, params: dict[str, str | list[str]]) -> str:
+    def _sub(m: re.Match) -> str:
+        quoted, bare = m.groups()
+        if quoted is not None:
+            return quote_literal(params[quoted]) if quoted in params else m.group(0)
+        if bare not in params:
+            return m.group(0)
+        value = params[bare]
+        return _array_literal(value) if isinstance(value, list) else str(value)
+
+    return " ".join(_PLACEHOLDER.sub(_sub, template).split()).strip()
+
+
+def render_bind(template: str) -> str:
+    def _sub(m: re.Match) -> str:
+        return f"%({m.group(1) or m.group(2)})s"
+
+    return " ".join(_PLACEHOLDER.sub(_sub, template).split()).strip()
+
+
+class Executor:
+    name = ""
+
+    def exec_sql(self, db: DbConfig, sql: str, args: str = "") -> PsqlResult:
+        raise NotImplementedError
+
+    def exec_file(
+        self,
+        db: DbConfig,
+        path: str,
+        args: str = "",
+        sinks: list[psql.OutputSink] | None = None,
+        options: str = "",
+    ) -> PsqlResult:
+        raise NotImplementedError
+
+    def query(self, db: DbConfig, template: str, args: str = "", **params: str | list[str]) -> PsqlResult:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PsqlExecutor(Executor):
+    name = "psql"
+
+    def exec_sql(self, db: DbConfig, sql: str, args: str = "") -> PsqlResult:
+        return psql.exec_sql(db=db, sql=sql, args=args)
+
+    def exec_file(
+        self,
+        db: DbConfig,
+        path: str,
+        args: str = "",
+        sinks: list[psql.OutputSink] | None = None,
+        options: str = "",
+    ) -> PsqlResult:
+        return psql.exec_file(db=db, path=path, args=args, sinks=sinks, options=options)
+
+    def query(self, db: DbConfig, template: str, args: str = "", **params: str | list[str]) -> PsqlResult:
+        return self.exec_sql(db, render_literal(template, params), args)
+
+    def close(self):
+        psql.close_sessions()
+
+
+class NativeExecutor(Executor):
+    name = "native"
+
+    def __init__(self):
+        self._pool: dict[str, tuple[threading.Lock, object]] = {}
+        self._pool_lock = threading.Lock()
+
+    @staticmethod
+    def _driver():
+        try:
+            import psycopg
+        except ImportError:
+            from .history import SQLApplyError
+            raise SQLApplyError("Backend 'native' requires psycopg (pip install 'psycopg[binary]')")
+        return psycopg
+
+    def _connect(self, db: DbConfig):
+        return self._driver().connect(psql.gen_login_url(db), autocommit=True)
+
+    def _slot(self, db: DbConfig) -> tuple[threading.Lock, object]:
+        key = psql.gen_login_url(db)
+        with self._pool_lock:
+            slot = self._pool.get(key)
+            if slot is None or slot[1].closed:
+                slot = (threading.Lock(), self._connect(db))
+                self._pool[key] = slot
+            return slot
+
+    def _execute(self, db: DbConfig, sql: str, params: dict | None, args: str) -> PsqlResult:
+        psycopg = self._driver()
+        started = time.perf_counter()
+
+        try:
+            lock, conn = self._slot(db)
+        except psycopg.OperationalError as e:
+            return PsqlResult(stdout="", stderr=str(e), combined=str(e), returncode=2)
+
+        rows: list[str] = []
+        with lock:
+            try:
+                with conn.transaction() if "-1" in args.split() else nullcontext():
+                    cur = conn.execute(sql, params, prepare=params is not None)
+                    while True:
+                        if cur.description is not None:
+                            for row in cur.fetchall():
+                                rows.append("|".join("" if v is None else str(v) for v in row))
+                        if not cur.nextset():
+                            break
+            except psycopg.OperationalError as e:
+                conn.close()
+                return PsqlResult(stdout="", stderr=str(e), combined=str(e), returncode=2)
+            except psycopg.Error as e:
+                message = f"ERROR:  {e}"
+                return PsqlResult(stdout="", stderr=message, combined=message, returncode=3)
+
+        out = "\n".join(rows)
+        return PsqlResult(
+            stdout=out, stderr="", combined=out, returncode=0,
+            duration=time.perf_counter() - started,
+        )
+
+    def exec_sql(self, db: DbConfig, sql: str, args: str = "") -> PsqlResult:
+        return self._execute(db, sql, None, args)
+
+    def exec_file(
+        self,
+        db: DbConfig,
+        path: str,
+        args: str = "",
+        sinks: list[psql.OutputSink] | None = None,
+        options: str = "",
+    ) -> PsqlResult:
+        return psql.exec_file(db=db, path=path, args=args, sinks=sinks, options=options)
+
+    def query(self, db: DbConfig, template: str, args: str = "", **params: str | list[str]) -> PsqlResult:
+        return self._execute(db, render_bind(template), params, args)
+
+    def close(self):
+        with self._pool_lock:
+            slots = list(self._pool.values())
+            self._pool.clear()
+        for _, conn in slots:
+            conn.close()
+
+
+BACKENDS: dict[str, type[Executor]] = {
+    PsqlExecutor.name: PsqlExecutor,
+    NativeExecutor.name: NativeExecutor,
+}
+
+_EXECUTORS: dict[str, Executor] = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+def get_executor(db: DbConfig) -> Executor:
+    with _EXECUTORS_LOCK:
+        executor = _EXECUTORS.get(db.backend)
+        if executor is None:
+            executor = BACKENDS[db.backend]()
+            _EXECUTORS[db.backend] = executor
+        return executor
+
+
+def close_executors():
+    with _EXECUTORS_LOCK:
+        executors = list(_EXECUTORS.values())
+        _EXECUTORS.clear()
+    for executor in executors:
+        executor.close()
+
+
+@contextmanager
+def connections():
+    with psql.sessions():
+        try:
+            yield
+        finally:
+            close_executors()
@@ -1,12 +1,33 @@
 import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Callable
 
 from .config import DbConfig
-from .models import ScriptState, ExecMode
-from .psql import exec_sql, exec_file
+from .models import (
+    BatchSpec,
+    ExecStatus,
+    HistoryRecord,
+    LoadSample,
+    ProbeResult,
+    PsqlResult,
+    ExecMode,
+)
+from .psql import SESSION_GRACE, STDERR, STDOUT, CaptureSink, OutputSink, PsqlSession, collect_result, exec_copy
+from .executor import get_executor, quote_literal, render_literal
+from .profile import PROFILER
+from .splitter import is_meta, is_transactional, statement_hash, transaction_units
 
 
 SCRIPTS_DIR = Path(__file__).resolve().parent / "scripts"
+SCHEMA_VERSION = 6
+
+_LOCK_TIMEOUT = re.compile(r"\b55P03\b|canceling statement due to lock timeout|could not obtain lock")
+_SQL_ERROR = re.compile(r"^(?:psql:\S*: )?ERROR:", re.MULTILINE)
 
 _SQL_CACHE: dict[str, str] = {}
 
@@ -17,11 +38,9 @@ def _sql(name: str) -> str:
     return _SQL_CACHE[name]
 
 
-def _fmt(template: str, **kwargs: str) -> str:
-    result = template
-    for key, value in kwargs.items():
-        result = result.replace(f"%{key}", value)
-    return " ".join(result.split()).strip()
+def _query(db: DbConfig, name: str, args: str = "", **params: str | list[str]) -> PsqlResult:
+    with PROFILER.measure("history queries"):
+        return get_executor(db).query(db, _sql(name), args, **params)
 
 
 class SQLApplyError(Exception):
@@ -36,9 +55,12 @@ class NotInitializedError(SQLApplyError):
     pass
 
 
-def init_db(db: DbConfig) -> None:
+def init_db(db: DbConfig, tail_lines: int | None = None) -> None:
     src = str(SCRIPTS_DIR / "init_sqlapply_schema.sql")
-    result = exec_file(db=db, path=src, args=ExecMode.SINGLE_TRANSACTION.psql_args)
+    result = get_executor(db).exec_file(
+        db=db, path=src, args=ExecMode.SINGLE_TRANSACTION.psql_args,
+        sinks=[CaptureSink(maxlen=tail_lines)],
+    )
 
     already_exists_notices = [
         "Schema sqlapply already exists.",
@@ -47,7 +69,8 @@ def init_db(db: DbConfig) -> None:
     ]
 
     if result.combined:
-        if all(notice in result.stderr for notice in already_exists_notices):
+        upgraded = "upgraded to version" in result.stderr
+        if not upgraded and all(notice in result.stderr for notice in already_exists_notices):
             logging.info(f"Database '{db.dbname}' already initialized")
             return
         for line in result.stderr.splitlines():
@@ -62,69 +85,147 @@ def init_db(db: DbConfig) -> None:
         logging.info(f"Database '{db.dbname}' initialized successfully")
 
 
-def check_db(db: DbConfig, check_init: bool = True) -> None:
-    sql = _fmt(_sql("get_sqla_history.sql"))
-    result = exec_sql(db=db, sql=sql, args=ExecMode.SINGLE_TRANSACTION.psql_args)
-
-    connect_errors = [
-        "psql: error: connection to server at",
-        "psql: error: connection to server on socket",
-        "FATAL:  Peer authentication failed",
-        "FATAL:  password authentication failed",
-        "FATAL:  role",
-        "FATAL:  database",
-    ]
+_CONNECT_ERRORS = [
+    "psql: error: connection to server at",
+    "psql: error: connection to server on socket",
+    "FATAL:  Peer authentication failed",
+    "FATAL:  password authentication failed",
+    "FATAL:  role",
+    "FATAL:  database",
+]
+
+
+def probe_db(name: str, db: DbConfig) -> ProbeResult:
+    result = _query(db, "probe_db.sql", "-t -A")
 
     if not result.ok:
-        if any(err in result.combined for err in connect_errors):
-            raise ConnectionError_(f"Connection error: {db.dbname} ({db.host}:{db.port})")
-        if not check_init:
-            return
-        if "does not exist" in result.combined:
+        if result.returncode == 2 or any(err in result.combined for err in _CONNECT_ERRORS):
+            return ProbeResult(name=name, reachable=False, error=result.stderr)
+        return ProbeResult(name=name, reachable=True, error=result.stderr)
+
+    initialized, comment, server_version, role = result.stdout.strip().rsplit("|", 3)
+    initialized = initialized.lower() in ("t", "true")
+    _, _, version = comment.partition("sqlapply:")
+    return ProbeResult(
+        name=name,
+        reachable=True,
+        initialized=initialized,
+        server_version=server_version,
+        role=role,
+        schema_version=int(version) if version.isdigit() else int(initialized),
+    )
+
+
+def probe_load(db: DbConfig) -> LoadSample | None:
+    result = _query(db, "get_load.sql", "-t -A")
+    if not result.ok:
+        logging.warning(f"Failed to read load of '{db.dbname}':\n{result.combined}")
+        return None
+
+    lag, _, active = result.stdout.strip().partition("|")
+    return LoadSample(replica_lag=float(lag) if lag else None, active_backends=int(active or 0))
+
+
+def preflight(dbs: dict[str, DbConfig], check_init: bool = True) -> list[ProbeResult]:
+    if not dbs:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(len(dbs), 32)) as pool:
+        probes = list(pool.map(lambda item: probe_db(*item), dbs.items()))
+
+    for probe in probes:
+        if probe.reachable and not probe.error:
+            logging.debug(f"Database '{probe.name}': PostgreSQL {probe.server_version}, role '{probe.role}'")
+
+    unreachable = [p for p in probes if not p.reachable]
+    if unreachable:
+        raise ConnectionError_("Connection error: " + ", ".join(
+            f"{dbs[p.name].dbname} ({dbs[p.name].host}:{dbs[p.name].port})" for p in unreachable
+        ))
+
+    failed = [p for p in probes if p.error]
+    if failed:
+        raise SQLApplyError("Preflight failed:\n" + "\n".join(f"{p.name}: {p.error}" for p in failed))
+
+    if check_init:
+        missing = [p.name for p in probes if not p.initialized]
+        if missing:
+            raise NotInitializedError(
+                f"Database(s) not initialized: {', '.join(missing)} (use '--init --dbname <dbname>')"
+            )
+        outdated = [p.name for p in probes if p.schema_version < SCHEMA_VERSION]
+        if outdated:
             raise NotInitializedError(
-                f"Database '{db.dbname}' not initialized (use '--init --dbname {db.dbname}')"
+                f"sqlapply schema is outdated in: {', '.join(outdated)} "
+                f"(version {SCHEMA_VERSION} required, use '--init --dbname <dbname>' to upgrade)"
             )
 
+    return probes
 
-def get_script_state(db: DbConfig, change_name: str, script_file: str) -> ScriptState:
-    sql = _fmt(
-        _sql("get_status_sqla_rec.sql"),
-        change_name=change_name,
-        script_file=script_file,
-    )
-    result = exec_sql(db=db, sql=sql, args="-t -A")
 
-    if not result.ok or not result.stdout.strip():
-        return ScriptState.NEW
+def check_db(db: DbConfig, check_init: bool = True) -> None:
+    preflight({db.dbname: db}, check_init)
+
+
+def load_history(db: DbConfig, change_name: str) -> dict[str, HistoryRecord]:
+    result = _query(db, "get_change_history.sql", "-t -A", change_name=change_name)
+
+    if not result.ok:
+        raise SQLApplyError(
+            f"Failed to load history of '{change_name}' from '{db.dbname}':\n{result.combined}"
+        )
 
-    return ScriptState.from_db_status(result.stdout.strip())
+    records: dict[str, HistoryRecord] = {}
+    for line in result.stdout.splitlines():
+        if not line.strip():
+            continue
+        (
+            script_file, status, src_checksum, execution_time,
+            duration_ms, stmt_index, stmt_hash, batch_next, batch_rows,
+        ) = line.rsplit("|", 8)
+        records[script_file] = HistoryRecord(
+            status=status,
+            src_checksum=src_checksum,
+            execution_time=execution_time,
+            duration_ms=int(duration_ms) if duration_ms.isdigit() else None,
+            stmt_index=int(stmt_index) if stmt_index.isdigit() else 0,
+            stmt_hash=stmt_hash,
+            batch_next=int(batch_next) if batch_next.lstrip("-").isdigit() else None,
+            batch_rows=int(batch_rows) if batch_rows.isdigit() else 0,
+        )
+    return records
 
 
-def get_src_hash(db: DbConfig, change_name: str, script_name: str) -> str | None:
-    sql = _fmt(
-        _sql("get_src_hash.sql"),
-        chg_name=change_name,
-        script_name=script_name,
+def update_record(
+    db: DbConfig,
+    change_name: str,
+    script_file: str,
+    status: str,
+    checksum: str,
+) -> None:
+    result = _query(
+        db, "update_sqla_rec.sql", ExecMode.SINGLE_TRANSACTION.psql_args,
+        change_name=change_name,
+        script_file=script_file,
+        new_status=status,
+        new_hash=checksum,
     )
-    result = exec_sql(db=db, sql=sql, args="-t -A")
 
     if not result.ok:
-        logging.error(f"Failed to get hash for {script_name} in {change_name}: {result.stderr}")
-        return None
-    if not result.stdout.strip():
-        return None
-    return result.stdout.strip()
+        raise SQLApplyError(f"Failed to update history record:\n{result.combined}")
+
 
+def insert_records(db: DbConfig, change_name: str, scripts: list[tuple[str, str]]) -> None:
+    if not scripts:
+        return
 
-def insert_record(db: DbConfig, change_name: str, script_file: str, checksum: str) -> None:
-    sql = _fmt(
-        _sql("insert_sqla_rec.sql"),
+    result = _query(
+        db, "insert_sqla_recs.sql", ExecMode.SINGLE_TRANSACTION.psql_args,
         change_name=change_name,
-        script_file=script_file,
         status="IN_PROGRESS",
-        src_checksum=checksum,
+        script_files=[name for name, _ in scripts],
+        src_checksums=[checksum for _, checksum in scripts],
     )
-    result = exec_sql(db=db, sql=sql, args=ExecMode.SINGLE_TRANSACTION.psql_args)
 
     if not result.ok:
         raise NotInitializedError(
@@ -132,21 +233,298 @@ def insert_record(db: DbConfig, change_name: str, script_file: str, checksum: st
         )
 
 
-def update_record(
+def update_records(
     db: DbConfig,
     change_name: str,
-    script_file: str,
     status: str,
-    checksum: str,
+    scripts: list[tuple[str, str]],
 ) -> None:
-    sql = _fmt(
-        _sql("update_sqla_rec.sql"),
+    if not scripts:
+        return
+
+    result = _query(
+        db, "update_sqla_recs.sql", ExecMode.SINGLE_TRANSACTION.psql_args,
         change_name=change_name,
-        script_file=script_file,
         new_status=status,
-        new_hash=checksum,
+        script_files=[name for name, _ in scripts],
+        src_checksums=[checksum for _, checksum in scripts],
     )
-    result = exec_sql(db=db, sql=sql, args=ExecMode.SINGLE_TRANSACTION.psql_args)
 
     if not result.ok:
-        raise SQLApplyError(f"Failed to update history record:\n{result.combined}")
+        raise SQLApplyError(f"Failed to update history records:\n{result.combined}")
+
+
+def update_timings(db: DbConfig, change_name: str, results: dict[str, PsqlResult]) -> dict[str, float]:
+    if not results:
+        return {}
+
+    result = _query(
+        db, "update_sqla_timings.sql", "-t -A",
+        change_name=change_name,
+        script_files=list(results),
+        durations=[str(round(r.duration * 1000)) for r in results.values()],
+        spawns=[str(round(r.spawn_time * 1000)) for r in results.values()],
+        retries=[str(r.retries) for r in results.values()],
+    )
+
+    if not result.ok:
+        logging.warning(f"Failed to record script timings in '{db.dbname}':\n{result.combined}")
+        return {}
+
+    exec_times: dict[str, float] = {}
+    for line in result.stdout.splitlines():
+        script_file, _, exec_ms = line.strip().rpartition("|")
+        if script_file and exec_ms:
+            exec_times[script_file] = int(exec_ms) / 1000
+    return exec_times
+
+
+def applied_digests(dbs: dict[str, DbConfig], change_name: str) -> dict[str, str]:
+    if not dbs:
+        return {}
+
+    def _read(item: tuple[str, DbConfig]) -> str:
+        name, db = item
+        result = _query(db, "get_applied_digest.sql", "-t -A", change_name=change_name, target=name)
+        return result.stdout.strip() if result.ok else ""
+
+    with ThreadPoolExecutor(max_workers=min(len(dbs), 32)) as pool:
+        digests = list(pool.map(_read, dbs.items()))
+    return {name: digest for name, digest in zip(dbs, digests) if digest}
+
+
+def set_applied_digest(db: DbConfig, change_name: str, target: str, digest: str):
+    result = _query(db, "set_applied_digest.sql", change_name=change_name, target=target, digest=digest)
+    if not result.ok:
+        logging.warning(f"Failed to record applied digest of '{change_name}' in '{db.dbname}':\n{result.combined}")
+
+
+class ChangeLock:
+    def __init__(self, db: DbConfig, change_name: str):
+        self.db = db
+        self.change_name = change_name
+        self._session: PsqlSession | None = None
+
+    def acquire(self) -> bool:
+        self._session = PsqlSession(self.db, read_timeout=self.db.connect_timeout + SESSION_GRACE)
+        result = self._session.execute(render_literal(_sql("try_change_lock.sql"), {"change_name": self.change_name}))
+        if not result.ok:
+            self.release()
+            raise SQLApplyError(f"Failed to lock change '{self.change_name}' in '{self.db.dbname}':\n{result.combined}")
+        if result.stdout.strip() != "t":
+            self.release()
+            return False
+        return True
+
+    def release(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+def exec_recorded(
+    db: DbConfig,
+    change_name: str,
+    script_file: str,
+    checksum: str,
+    path: Path,
+    args: str,
+    sinks: list[OutputSink] | None = None,
+    options: str = "",
+) -> PsqlResult:
+    update = render_literal(_sql("record_success_sqla_rec.sql"), {
+        "change_name": change_name,
+        "script_file": script_file,
+        "new_hash": checksum,
+    })
+    wrapper = f"\\i {quote_literal(str(path.resolve()))}\n{update}\n"
+
+    fd, wrapper_path = tempfile.mkstemp(prefix="sqlapply_", suffix=".sql")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(wrapper)
+        return get_executor(db).exec_file(db=db, path=wrapper_path, args=args, sinks=sinks, options=options)
+    finally:
+        os.unlink(wrapper_path)
+
+
+def exec_copied(
+    db: DbConfig,
+    change_name: str,
+    script_file: str,
+    checksum: str,
+    copy_command: str,
+    source: BinaryIO,
+    sinks: list[OutputSink] | None = None,
+    options: str = "",
+) -> PsqlResult:
+    update = render_literal(_sql("record_success_sqla_rec.sql"), {
+        "change_name": change_name,
+        "script_file": script_file,
+        "new_hash": checksum,
+    })
+    result = exec_copy(db, [copy_command, update], source, "-X -1 -v ON_ERROR_STOP=on", sinks, options)
+    if result.returncode == 1 and _SQL_ERROR.search(result.stderr):
+        result.returncode = 3
+    return result
+
+
+def is_lock_timeout(result: PsqlResult) -> bool:
+    return result.status in (ExecStatus.SCRIPT_ERROR, ExecStatus.PSQL_FATAL_ERROR) and bool(
+        _LOCK_TIMEOUT.search(result.stderr)
+    )
+
+
+def _terminated(statement: str) -> str:
+    statement = statement.strip()
+    return statement if statement.endswith(";") or is_meta(statement) else statement + "\n;"
+
+
+def exec_checkpointed(
+    db: DbConfig,
+    change_name: str,
+    script_file: str,
+    statements: list[str],
+    start: int = 0,
+    sinks: list[OutputSink] | None = None,
+    options: str = "",
+) -> PsqlResult:
+    if sinks is None:
+        sinks = [CaptureSink()]
+
+    def _emit(stream: str, text: str):
+        for line in text.splitlines():
+            for sink in sinks:
+                sink.write(stream, line)
+
+    started = time.perf_counter()
+    session = PsqlSession(db, options)
+    spawn_time = time.perf_counter() - started
+    returncode = 0
+
+    try:
+        for first, last, explicit in transaction_units(statements, start):
+            body = [_terminated(s) for s in statements[first:last + 1]]
+            checkpoint = _terminated(render_literal(_sql("update_sqla_checkpoint.sql"), {
+                "change_name": change_name,
+                "script_file": script_file,
+                "stmt_index": str(last + 1),
+                "stmt_hash": statement_hash(statements[last]),
+            }))
+            _emit(STDOUT, "\n".join(body))
+
+            if explicit:
+                result = session.execute("\n".join(body[:-1] + [checkpoint, body[-1]]))
+            elif is_transactional(body[0]):
+                result = session.execute(f"{body[0]}\n{checkpoint}", single_transaction=True)
+            else:
+                result = session.execute(body[0])
+                if result.ok:
+                    result = session.execute(checkpoint)
+
+            _emit(STDOUT, result.stdout)
+            _emit(STDERR, result.stderr)
+            if not result.ok:
+                returncode = result.returncode
+                break
+    finally:
+        session.close()
+
+    return collect_result(sinks, returncode, time.perf_counter() - started, spawn_time)
+
+
+_ROW_COUNT = re.compile(r"^(?:UPDATE|DELETE|MERGE|INSERT \d+) (\d+)$")
+
+
+def exec_batched(
+    db: DbConfig,
+    change_name: str,
+    script_file: str,
+    path: Path,
+    spec: BatchSpec,
+    resume: tuple[int, int] | None = None,
+    sinks: list[OutputSink] | None = None,
+    should_stop: Callable[[], bool] = lambda: False,
+    options: str = "",
+    pause: Callable[[], None] = lambda: None,
+) -> tuple[PsqlResult, bool]:
+    if sinks is None:
+        sinks = [CaptureSink()]
+
+    def _emit(stream: str, text: str):
+        for line in text.splitlines():
+            for sink in sinks:
+                sink.write(stream, line)
+
+    started = time.perf_counter()
+    session = PsqlSession(db, options)
+    spawn_time = time.perf_counter() - started
+    include = f"\\i {quote_literal(str(path.resolve()))}"
+    returncode = 0
+    done = False
+
+    try:
+        bounds = session.execute(render_literal(_sql("get_batch_range.sql"), {"table": spec.table, "key": spec.key}))
+        _emit(STDERR, bounds.stderr)
+        low, _, high = bounds.stdout.strip().partition("|")
+        if not bounds.ok:
+            returncode = bounds.returncode
+        elif not high:
+            done = True
+        elif not (low.lstrip("-").isdigit() and high.lstrip("-").isdigit()):
+            _emit(STDERR, f"Batch key '{spec.key}' of '{spec.table}' must be an integer column")
+            returncode = 3
+        else:
+            position, rows = resume if resume else (int(low), 0)
+            high = int(high)
+            processed = 0
+            last_report = time.perf_counter()
+            while position <= high:
+                if should_stop():
+                    _emit(STDERR, f"Interrupted before {spec.key} >= {position}")
+                    break
+
+                end = min(position + spec.size, high + 1)
+                _emit(STDOUT, f"-- batch {spec.key} >= {position} AND {spec.key} < {end}")
+                result = session.execute(
+                    f"\\set batch_start {position}\n\\set batch_end {end}\n"
+                    f"BEGIN;\n\\set QUIET off\n{include}\n\\set QUIET on"
+                )
+                _emit(STDOUT, result.stdout)
+                _emit(STDERR, result.stderr)
+                batch_rows = sum(int(m.group(1)) for m in map(_ROW_COUNT.match, result.stdout.splitlines()) if m)
+
+                if result.ok:
+                    checkpoint = render_literal(_sql("update_sqla_batch.sql"), {
+                        "change_name": change_name,
+                        "script_file": script_file,
+                        "batch_next": str(end),
+                        "batch_rows": str(rows + batch_rows),
+                    })
+                    result = session.execute(f"{checkpoint};\nCOMMIT;")
+                    _emit(STDERR, result.stderr)
+                if not result.ok:
+                    session.execute("ROLLBACK;")
+                    returncode = result.returncode
+                    break
+
+                rows += batch_rows
+                processed += batch_rows
+                position = end
+                if time.perf_counter() - last_report >= 10 or position > high:
+                    elapsed = time.perf_counter() - started
+                    logging.info(
+                        f"'{script_file}': {spec.key} {position - 1}/{high}, "
+                        f"{rows} rows ({processed / elapsed if elapsed else 0:.0f} rows/s)"
+                    )
+                    last_report = time.perf_counter()
+                if position <= high:
+                    if spec.sleep:
+                        time.sleep(spec.sleep)
+                    pause()
+            else:
+                done = True
+    finally:
+        session.close()
+
+    return collect_result(sinks, returncode, time.perf_counter() - started, spawn_time), done
@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+import threading
+
+from hashlib import sha256
+from pathlib import Path
+
+from .models import Script
+
+
+MANIFEST_FILE = ".sqlapply-manifest.json"
+
+
+def script_digest(scripts: list[Script]) -> str:
+    digest = sha256()
+    for script in scripts:
+        digest.update(f"{script.name}\0{script.checksum}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ChangeManifest:
+    def __init__(self, change_path: Path):
+        self.path = change_path / MANIFEST_FILE
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._sections: dict[str, dict] = {}
+        self._stamps: dict[str, dict[str, list[int]]] = {}
+
+        if self.path.exists():
+            try:
+                self._sections = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                logging.warning(f"Manifest '{self.path}' is unreadable, rebuilding")
+
+    @staticmethod
+    def _scan(db_dir: Path) -> dict[str, list[int]]:
+        stamps = {}
+        for entry in os.scandir(db_dir):
+            if entry.is_file():
+                st = entry.stat()
+                stamps[entry.name] = [st.st_size, st.st_mtime_ns, st.st_ino]
+        return stamps
+
+    def digest(self, db_dir: Path, pattern: str) -> str | None:
+        with self._lock:
+            stamps = self._stamps.get(db_dir.name)
+            if stamps is None:
+                stamps = self._stamps[db_dir.name] = self._scan(db_dir)
+            section = self._sections.get(db_dir.name)
+        if section and section.get("pattern") == pattern and section.get("files") == stamps:
+            return section.get("digest")
+        return None
+
+    def count(self, db_dir: Path) -> int:
+        return len(self._sections.get(db_dir.name, {}).get("scripts", []))
+
+    def update(self, db_dir: Path, pattern: str, scripts: list[Script]) -> str:
+        if self.digest(db_dir, pattern) is None:
+            section = {
+                "pattern": pattern,
+                "digest": script_digest(scripts),
+                "scripts": [[s.name, s.checksum] for s in scripts],
+                "files": self._stamps[db_dir.name],
+            }
+            with self._lock:
+                self._sections[db_dir.name] = section
+                self._dirty = True
+        return self._sections[db_dir.name]["digest"]
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with self._lock:
+                tmp.write_text(json.dumps(self._sections, indent=1, sort_keys=True), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError as e:
+            tmp.unlink(missing_ok=True)
+            logging.warning(f"Failed to write manifest '{self.path}': {e}")
@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 from enum import Enum
+from hashlib import md5
 from pathlib import Path
 
 
@@ -38,9 +39,27 @@ class ScriptState(Enum):
         return mapping.get(status.upper(), cls.FAILED)
 
 
+@dataclass
+class HistoryRecord:
+    status: str
+    src_checksum: str
+    execution_time: str
+    duration_ms: int | None = None
+    stmt_index: int = 0
+    stmt_hash: str = ""
+    batch_next: int | None = None
+    batch_rows: int = 0
+
+    @property
+    def state(self) -> ScriptState:
+        return ScriptState.from_db_status(self.status)
+
+
 class ExecMode(Enum):
     SINGLE_TRANSACTION = "single-transaction"
     ON_ERROR_STOP = "on-error-stop"
+    STATEMENT = "statement"
+    BATCHED = "batched"
 
     @property
     def psql_args(self) -> str:
@@ -61,6 +80,13 @@ class PsqlResult:
     stderr: str
     combined: str
     returncode: int
+    log_path: Path | None = None
+    duration: float = 0.0
+    spawn_time: float = 0.0
+    retries: int = 0
+
+    def tail(self, lines: int) -> list[str]:
+        return self.combined.splitlines()[-lines:]
 
     @property
     def ok(self) -> bool:
@@ -71,9 +97,110 @@ class PsqlResult:
         return ExecStatus.from_returncode(self.returncode)
 
 
+@dataclass
+class ProbeResult:
+    name: str
+    reachable: bool
+    initialized: bool = False
+    server_version: str = ""
+    role: str = ""
+    schema_version: int = 0
+    error: str = ""
+
+
+@dataclass
+class LoadSample:
+    replica_lag: float | None
+    active_backends: int
+
+
+@dataclass
+class BatchSpec:
+    table: str
+    key: str
+    size: int
+    sleep: float = 0.0
+
+
+@dataclass
+class LockPolicy:
+    lock_timeout: str = ""
+    statement_timeout: str = ""
+    retries: int = 0
+    retry_delay: float = 1.0
+
+    @property
+    def pg_options(self) -> str:
+        options = []
+        if self.lock_timeout:
+            options.append(f"-c lock_timeout={self.lock_timeout}")
+        if self.statement_timeout:
+            options.append(f"-c statement_timeout={self.statement_timeout}")
+        return " ".join(options)
+
+
+@dataclass
+class CopySpec:
+    table: str
+    columns: list[str] = field(default_factory=list)
+    format: str = "csv"
+    header: bool = False
+    delimiter: str | None = None
+    null: str | None = None
+    encoding: str = "UTF8"
+    depends: list[str] | None = None
+
+
 @dataclass
 class Script:
     name: str
-    content: str
     path: Path
     state: ScriptState = field(default=ScriptState.NEW)
+    copy: CopySpec | None = None
+    _checksum: str | None = field(default=None, init=False, repr=False)
+
+    @property
+    def checksum(self) -> str:
+        if self._checksum is None:
+            digest = md5()
+            if self.copy is not None:
+                with open(self.path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(chunk)
+            else:
+                with open(self.path, encoding="utf-8") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), ""):
+                        digest.update(chunk.encode("utf-8"))
+            self._checksum = digest.hexdigest()
+        return self._checksum
+
+    @checksum.setter
+    def checksum(self, value: str):
+        self._checksum = value
+
+
+@dataclass
+class DbRun:
+    name: str
+    stop: bool = False
+    executed: int = 0
+    skipped: int = 0
+    stopped: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+    timings: dict[str, PsqlResult] = field(default_factory=dict)
+    expected: float = 0.0
+    unestimated: int = 0
+    paused: float = 0.0
+    locked_out: bool = False
+
+    def summary(self) -> str:
+        if self.locked_out:
+            return f"'{self.name}': claimed by another runner"
+        text = f"'{self.name}': {self.executed} executed, {self.skipped} skipped"
+        if self.paused:
+            text += f", throttled {self.paused:.1f}s"
+        if self.stopped:
+            text += f", {len(self.stopped)} stopped"
+        if self.failed:
+            text += f", failed: {', '.join(self.failed)}"
+        return text
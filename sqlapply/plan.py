@@ -0,0 +1,144 @@
+import logging
+import re
+
+from .config import TIMEOUT_RE, DbConfig
+from .models import BatchSpec, LockPolicy, Script
+from .history import SQLApplyError
+
+
+_DIRECTIVE_RE = re.compile(r"^--\s*sqlapply:\s*([\w-]+)\s*(.*)$", re.IGNORECASE)
+_IDENTIFIER_RE = re.compile(r'^(?:\w+|"[^"]+")(?:\.(?:\w+|"[^"]+"))?$')
+_BATCH_VARS = ("batch_start", "batch_end")
+
+
+def read_directives(script: Script) -> list[tuple[str, str]]:
+    directives: list[tuple[str, str]] = []
+    if script.copy is not None:
+        return directives
+    with open(script.path, encoding="utf-8") as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if not stripped.startswith("--"):
+                break
+            m = _DIRECTIVE_RE.match(stripped)
+            if m:
+                directives.append((m.group(1).lower(), m.group(2).strip()))
+    return directives
+
+
+def read_depends(script: Script) -> list[str] | None:
+    if script.copy is not None:
+        return script.copy.depends
+    depends: list[str] | None = None
+    for name, value in read_directives(script):
+        if name == "depends-on":
+            depends = (depends or []) + [d for d in re.split(r"[,\s]+", value) if d]
+    return depends
+
+
+def read_batch_spec(script: Script) -> BatchSpec | None:
+    options: dict[str, str] = {}
+    for name, value in read_directives(script):
+        if name == "batch":
+            for item in value.split():
+                key, _, val = item.partition("=")
+                options[key.lower()] = val
+    if not options:
+        return None
+
+    table, key = options.get("table", ""), options.get("key", "")
+    if not _IDENTIFIER_RE.match(table) or not _IDENTIFIER_RE.match(key):
+        raise SQLApplyError(f"'{script.name}': batch header needs valid 'table' and 'key'")
+    try:
+        size = int(options.get("size", "10000"))
+        sleep = float(options.get("sleep", "0"))
+    except ValueError:
+        raise SQLApplyError(f"'{script.name}': batch 'size' must be an integer and 'sleep' a number")
+    if size < 1 or sleep < 0:
+        raise SQLApplyError(f"'{script.name}': batch 'size' must be positive and 'sleep' not negative")
+    text = script.path.read_text(encoding="utf-8")
+    missing = [var for var in _BATCH_VARS if not re.search(rf":['\"]?{var}\b", text)]
+    if missing:
+        raise SQLApplyError(f"'{script.name}': batched script must use {' and '.join(':' + v for v in missing)}")
+    return BatchSpec(table=table, key=key, size=size, sleep=sleep)
+
+
+def read_lock_policy(script: Script, db: DbConfig) -> LockPolicy:
+    policy = LockPolicy(
+        lock_timeout=db.lock_timeout,
+        statement_timeout=db.statement_timeout,
+        retries=db.lock_retries,
+        retry_delay=db.lock_retry_delay,
+    )
+    for name, value in read_directives(script):
+        if name in ("lock-timeout", "statement-timeout"):
+            if not TIMEOUT_RE.match(value):
+                raise SQLApplyError(f"'{script.name}': '{name}' must be a duration like 5s or 500ms")
+            setattr(policy, name.replace("-", "_"), value)
+        elif name == "lock-retries":
+            if not value.isdigit():
+                raise SQLApplyError(f"'{script.name}': 'lock-retries' must be an integer")
+            policy.retries = int(value)
+    return policy
+
+
+def build_graph(scripts: list[Script]) -> dict[str, list[str]]:
+    names = {s.name for s in scripts}
+    graph: dict[str, list[str]] = {}
+    prev = None
+
+    for script in scripts:
+        depends = read_depends(script)
+        if depends is None:
+            graph[script.name] = [prev] if prev else []
+        else:
+            for dep in depends:
+                if dep not in names:
+                    logging.warning(f"'{script.name}' depends on '{dep}' which is not in the changeset, ignoring")
+            graph[script.name] = [dep for dep in depends if dep in names and dep != script.name]
+        prev = script.name
+
+    build_waves(graph)
+    return graph
+
+
+def build_waves(graph: dict[str, list[str]]) -> list[list[str]]:
+    level: dict[str, int] = {}
+    order = list(graph)
+    remaining = set(order)
+
+    while remaining:
+        progressed = False
+        for name in order:
+            if name in level or any(dep not in level for dep in graph[name]):
+                continue
+            level[name] = max((level[dep] + 1 for dep in graph[name]), default=0)
+            remaining.discard(name)
+            progressed = True
+        if not progressed:
+            raise SQLApplyError(f"Dependency cycle between scripts: {', '.join(sorted(remaining))}")
+
+    waves: list[list[str]] = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for name in order:
+        waves[level[name]].append(name)
+    return waves
+
+
+def contract_graph(graph: dict[str, list[str]], removed: set[str]) -> dict[str, list[str]]:
+    resolved: dict[str, list[str]] = {}
+    for wave in build_waves(graph):
+        for name in wave:
+            deps = (resolved[dep] if dep in removed else [dep] for dep in graph[name])
+            resolved[name] = list(dict.fromkeys(d for group in deps for d in group))
+    return {name: resolved[name] for name in graph if name not in removed}
+
+
+def critical_path(graph: dict[str, list[str]]) -> list[str]:
+    best: dict[str, list[str]] = {}
+    for wave in build_waves(graph):
+        for name in wave:
+            longest = max((best[dep] for dep in graph[name]), key=len, default=[])
+            best[name] = longest + [name]
+    return max(best.values(), key=len, default=[])
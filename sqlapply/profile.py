@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+@dataclass
+class ScriptTiming:
+    dbname: str
+    script: str
+    duration: float
+    spawn: float = 0.0
+    sql: float | None = None
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scripts: list[ScriptTiming] = []
+        self.databases: dict[str, float] = {}
+        self.overhead: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+
+    def add_overhead(self, category: str, seconds: float):
+        with self._lock:
+            self.overhead[category] += seconds
+            self.calls[category] += 1
+
+    @contextmanager
+    def measure(self, category: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_overhead(category, time.perf_counter() - started)
+
+    def add_script(self, timing: ScriptTiming):
+        with self._lock:
+            self.scripts.append(timing)
+
+    def add_database(self, dbname: str, seconds: float):
+        with self._lock:
+            self.databases[dbname] = self.databases.get(dbname, 0.0) + seconds
+
+    def reset(self):
+        with self._lock:
+            self.scripts.clear()
+            self.databases.clear()
+            self.overhead.clear()
+            self.calls.clear()
+
+    def report(self, top: int = 10) -> list[str]:
+        with self._lock:
+            scripts = sorted(self.scripts, key=lambda t: t.duration, reverse=True)
+            databases = dict(self.databases)
+            overhead = dict(self.overhead)
+            calls = dict(self.calls)
+
+        lines = [f"Slowest scripts (top {min(top, len(scripts))} of {len(scripts)}):"]
+        for t in scripts[:top]:
+            sql = f", sql {t.sql:.3f}s" if t.sql is not None else ""
+            lines.append(f"- {t.dbname}/{t.script}: {t.duration:.3f}s (spawn {t.spawn:.3f}s{sql})")
+
+        lines.append("Total time per database:")
+        for dbname, seconds in sorted(databases.items(), key=lambda item: item[1], reverse=True):
+            count = sum(1 for t in scripts if t.dbname == dbname)
+            lines.append(f"- {dbname}: {seconds:.3f}s ({count} scripts)")
+
+        user_sql = sum(t.sql if t.sql is not None else t.duration - t.spawn for t in scripts)
+        client = sum(t.duration - t.spawn - t.sql for t in scripts if t.sql is not None)
+        overhead["script spawns"] = sum(t.spawn for t in scripts)
+        calls["script spawns"] = len(scripts)
+        if client > 0:
+            overhead["connect and client"] = client
+            calls["connect and client"] = sum(1 for t in scripts if t.sql is not None)
+
+        lines.append(f"sqlapply overhead: {sum(overhead.values()):.3f}s, user SQL: {user_sql:.3f}s")
+        for category, seconds in sorted(overhead.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"- {category}: {seconds:.3f}s ({calls[category]} calls)")
+        return lines
+
+    def log_report(self, top: int = 10):
+        logging.info("Profile:")
+        for line in self.report(top):
+            logging.info(line)
+
+
+PROFILER = Profiler()
@@ -1,11 +1,24 @@
+import os
+import re
 import shlex
-import select
+import selectors
 import subprocess
+import threading
+import time
 
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable
 from urllib.parse import quote
 
-from .config import DbConfig
+from .config import DbConfig, timeout_seconds
 from .models import PsqlResult
+from .splitter import is_unterminated
+
+
+SESSION_GRACE = 30.0
+_STATEMENT_TIMEOUT = re.compile(r"statement_timeout=(\S+)")
 
 
 def gen_login_url(db: DbConfig) -> str:
@@ -14,58 +27,357 @@ def gen_login_url(db: DbConfig) -> str:
         params = [f"user={quote(db.user)}"]
         if db.password:
             params.append(f"password={quote(db.password)}")
+        if db.connect_timeout:
+            params.append(f"connect_timeout={db.connect_timeout}")
         return url + "?" + "&".join(params)
 
     url = f"postgresql://{quote(db.user)}"
     if db.password:
         url += f":{quote(db.password)}"
     url += f"@{quote(db.host)}:{db.port}/{quote(db.dbname)}"
+    if db.connect_timeout:
+        url += f"?connect_timeout={db.connect_timeout}"
     return url
 
 
-def _run(cmd: str) -> PsqlResult:
-    parts = shlex.split(cmd)
-    proc = subprocess.Popen(
+STDOUT = "stdout"
+STDERR = "stderr"
+
+
+class OutputSink:
+    def write(self, stream: str, line: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CaptureSink(OutputSink):
+    def __init__(self, maxlen: int | None = None):
+        self.stdout: deque[str] = deque(maxlen=maxlen)
+        self.stderr: deque[str] = deque(maxlen=maxlen)
+        self.combined: deque[str] = deque(maxlen=maxlen)
+
+    def write(self, stream: str, line: str):
+        line = line.strip()
+        if not line:
+            return
+        (self.stdout if stream == STDOUT else self.stderr).append(line)
+        self.combined.append(line)
+
+
+class FileSink(OutputSink):
+    def __init__(self, path: Path, header: str | None = None):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        if header:
+            self._file.write(header + "\n")
+
+    def write(self, stream: str, line: str):
+        self._file.write(line + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+def _pump(streams: dict, on_line: Callable[[str, str], bool], timeout: float | None = None) -> bool:
+    buffers = {stream: b"" for stream in streams}
+    pending = set(streams)
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def _emit(stream, raw: bytes) -> bool:
+        return on_line(streams[stream], raw.decode("utf-8", errors="replace").rstrip("\r"))
+
+    with selectors.DefaultSelector() as sel:
+        for stream in pending:
+            sel.register(stream, selectors.EVENT_READ)
+
+        while pending:
+            ready = sel.select(None if deadline is None else max(deadline - time.monotonic(), 0))
+            if not ready and deadline is not None and time.monotonic() >= deadline:
+                return False
+            for key, _ in ready:
+                stream = key.fileobj
+                chunk = os.read(stream.fileno(), 65536)
+                if not chunk:
+                    if buffers[stream]:
+                        _emit(stream, buffers[stream])
+                    sel.unregister(stream)
+                    pending.discard(stream)
+                    continue
+
+                *complete, buffers[stream] = (buffers[stream] + chunk).split(b"\n")
+                for raw in complete:
+                    if _emit(stream, raw) is False:
+                        sel.unregister(stream)
+                        pending.discard(stream)
+                        break
+    return True
+
+
+def collect_result(
+    sinks: list[OutputSink],
+    returncode: int,
+    duration: float = 0.0,
+    spawn_time: float = 0.0,
+) -> PsqlResult:
+    capture = next((sink for sink in sinks if isinstance(sink, CaptureSink)), CaptureSink())
+    log = next((sink for sink in sinks if isinstance(sink, FileSink)), None)
+    return PsqlResult(
+        stdout="\n".join(capture.stdout),
+        stderr="\n".join(capture.stderr),
+        combined="\n".join(capture.combined),
+        returncode=returncode,
+        log_path=log.path if log else None,
+        duration=duration,
+        spawn_time=spawn_time,
+    )
+
+
+COPY_CHUNK = 1 << 20
+
+
+def _feed(source: BinaryIO, proc: subprocess.Popen, errors: list[str]):
+    try:
+        while True:
+            try:
+                chunk = source.read(COPY_CHUNK)
+            except (OSError, EOFError) as e:
+                errors.append(f"sqlapply: cannot read data file: {e}")
+                proc.kill()
+                return
+            if not chunk:
+                return
+            proc.stdin.write(chunk)
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def pg_env(options: str = "") -> dict[str, str] | None:
+    if not options:
+        return None
+    return {**os.environ, "PGOPTIONS": f"{os.environ.get('PGOPTIONS', '')} {options}".strip()}
+
+
+def _run(
+    parts: list[str],
+    sinks: list[OutputSink] | None = None,
+    source: BinaryIO | None = None,
+    options: str = "",
+) -> PsqlResult:
+    if sinks is None:
+        sinks = [CaptureSink()]
+
+    def _dispatch(stream: str, line: str) -> bool:
+        for sink in sinks:
+            sink.write(stream, line)
+        return True
+
+    started = time.perf_counter()
+    with subprocess.Popen(
         parts,
+        stdin=subprocess.PIPE if source is not None else None,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True,
-    )
+        env=pg_env(options),
+    ) as proc:
+        spawn_time = time.perf_counter() - started
+        feeder = None
+        errors: list[str] = []
+        if source is not None:
+            feeder = threading.Thread(target=_feed, args=(source, proc, errors), daemon=True)
+            feeder.start()
+        _pump({proc.stdout: STDOUT, proc.stderr: STDERR}, _dispatch)
+        if feeder is not None:
+            feeder.join()
+    for error in errors:
+        _dispatch(STDERR, error)
+    returncode = 1 if errors else proc.returncode
+    return collect_result(sinks, returncode, time.perf_counter() - started, spawn_time)
 
-    stdout_lines: list[str] = []
-    stderr_lines: list[str] = []
-    combined: list[str] = []
-
-    while proc.poll() is None:
-        readable, _, _ = select.select([proc.stdout, proc.stderr], [], [], 0.1)
-        for stream in readable:
-            line = stream.readline().strip()
-            if line:
-                bucket = stdout_lines if stream == proc.stdout else stderr_lines
-                bucket.append(line)
-                combined.append(line)
-
-    rest_out, rest_err = proc.communicate()
-    for line in (rest_out or "").strip().splitlines():
-        stdout_lines.append(line)
-        combined.append(line)
-    for line in (rest_err or "").strip().splitlines():
-        stderr_lines.append(line)
-        combined.append(line)
 
-    return PsqlResult(
-        stdout="\n".join(stdout_lines),
-        stderr="\n".join(stderr_lines),
-        combined="\n".join(combined),
-        returncode=proc.returncode,
-    )
+class PsqlSession:
+    SESSION_ARGS = {"-t", "-A", "-X", "-eX", "-e", "-1", "-v", "ON_ERROR_STOP=on"}
+
+    def __init__(self, db: DbConfig, options: str = "", read_timeout: float | None = None):
+        self.db = db
+        self.read_timeout = read_timeout if read_timeout is not None else session_timeout(db, options)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._proc = subprocess.Popen(
+            ["psql", gen_login_url(db), "-X", "-q", "-t", "-A", "-v", "ON_ERROR_STOP=0"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+            env=pg_env(options),
+        )
+
+    @property
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    @classmethod
+    def supports(cls, args: str) -> bool:
+        return all(arg in cls.SESSION_ARGS for arg in shlex.split(args))
+
+    def execute(self, sql: str, single_transaction: bool = False) -> PsqlResult:
+        with self._lock:
+            started = time.perf_counter()
+            self._seq += 1
+            marker = f"__sqlapply_{os.getpid()}_{self._seq}__"
+
+            body = sql.strip()
+            if not body:
+                return PsqlResult(stdout="", stderr="", combined="", returncode=0)
+            if is_unterminated(body):
+                message = "ERROR:  unterminated quoted string, dollar quote or comment at end of statement"
+                return PsqlResult(stdout="", stderr=message, combined=message, returncode=3)
+            if not body.endswith(";") and not body.splitlines()[-1].startswith("\\"):
+                body += "\n;"
+            if single_transaction:
+                body = f"BEGIN;\n{body}\nCOMMIT;"
+
+            command = (
+                "\\set LAST_ERROR_SQLSTATE 00000\n"
+                f"{body}\n"
+                f"\\echo {marker} :LAST_ERROR_SQLSTATE\n"
+                f"\\warn {marker}\n"
+            )
+            try:
+                self._proc.stdin.write(command.encode("utf-8"))
+                self._proc.stdin.flush()
+            except (BrokenPipeError, ValueError):
+                pass
+
+            result = self._read_until(marker)
+            result.duration = time.perf_counter() - started
+            return result
+
+    def _read_until(self, marker: str) -> PsqlResult:
+        capture = CaptureSink()
+        sqlstate = None
+
+        def _on_line(stream: str, line: str) -> bool:
+            nonlocal sqlstate
+            if line.startswith(marker):
+                if stream == STDOUT:
+                    sqlstate = line[len(marker):].strip()
+                return False
+            capture.write(stream, line)
+            return True
+
+        if not _pump({self._proc.stdout: STDOUT, self._proc.stderr: STDERR}, _on_line, self.read_timeout):
+            self._proc.kill()
+            self._proc.wait()
+            capture.write(STDERR, f"sqlapply: no response from psql within {self.read_timeout:g}s, session terminated")
+            return PsqlResult(
+                stdout="\n".join(capture.stdout),
+                stderr="\n".join(capture.stderr),
+                combined="\n".join(capture.combined),
+                returncode=2,
+            )
+
+        if sqlstate is None:
+            self._proc.wait()
+            returncode = self._proc.returncode or 2
+        else:
+            returncode = 0 if sqlstate == "00000" else 3
+
+        return PsqlResult(
+            stdout="\n".join(capture.stdout),
+            stderr="\n".join(capture.stderr),
+            combined="\n".join(capture.combined),
+            returncode=returncode,
+        )
+
+    def close(self):
+        if self.alive:
+            try:
+                self._proc.stdin.write(b"\\q\n")
+                self._proc.stdin.close()
+            except (BrokenPipeError, ValueError):
+                pass
+        try:
+            self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            self._proc.wait()
+
+
+_SESSIONS: dict[str, PsqlSession] = {}
+_SESSIONS_LOCK = threading.Lock()
+_sessions_enabled = False
+
+
+@contextmanager
+def sessions():
+    global _sessions_enabled
+    _sessions_enabled = True
+    try:
+        yield
+    finally:
+        _sessions_enabled = False
+        close_sessions()
+
+
+def close_sessions():
+    with _SESSIONS_LOCK:
+        opened = list(_SESSIONS.values())
+        _SESSIONS.clear()
+    for session in opened:
+        session.close()
+
+
+def session_timeout(db: DbConfig, options: str = "") -> float | None:
+    m = _STATEMENT_TIMEOUT.search(options)
+    if m is None:
+        return None
+    seconds = timeout_seconds(m.group(1))
+    return seconds + db.connect_timeout + SESSION_GRACE if seconds else None
+
+
+def _get_session(db: DbConfig) -> PsqlSession:
+    key = gen_login_url(db)
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None or not session.alive:
+            session = PsqlSession(db, read_timeout=db.connect_timeout + SESSION_GRACE)
+            _SESSIONS[key] = session
+        return session
 
 
 def exec_sql(db: DbConfig, sql: str, args: str = "") -> PsqlResult:
-    cmd = f"psql {gen_login_url(db)} {args} -c \"{sql}\""
-    return _run(cmd)
+    if _sessions_enabled and PsqlSession.supports(args):
+        return _get_session(db).execute(sql, single_transaction="-1" in shlex.split(args))
+
+    return _run(["psql", gen_login_url(db), *shlex.split(args), "-c", sql])
+
+
+def exec_file(
+    db: DbConfig,
+    path: str,
+    args: str = "",
+    sinks: list[OutputSink] | None = None,
+    options: str = "",
+) -> PsqlResult:
+    return _run(["psql", gen_login_url(db), *shlex.split(args), "-f", path], sinks, options=options)
 
 
-def exec_file(db: DbConfig, path: str, args: str = "") -> PsqlResult:
-    cmd = f"psql {gen_login_url(db)} {args} -f {path}"
-    return _run(cmd)
+def exec_copy(
+    db: DbConfig,
+    commands: list[str],
+    source: BinaryIO,
+    args: str = "",
+    sinks: list[OutputSink] | None = None,
+    options: str = "",
+) -> PsqlResult:
+    parts = ["psql", gen_login_url(db), *shlex.split(args)]
+    for command in commands:
+        parts += ["-c", command]
+    return _run(parts, sinks, source, options)
@@ -0,0 +1,3 @@
+SELECT digest
+FROM sqlapply.sqlapply_applied
+WHERE change_name = '%change_name' AND db = '%target' AND digest <> '';
\ No newline at end of file
@@ -0,0 +1 @@
+SELECT min(%key), max(%key) FROM %table;
\ No newline at end of file
@@ -0,0 +1,3 @@
+SELECT script_file, status, src_checksum, execution_time, duration_ms, stmt_index, stmt_hash, batch_next, batch_rows
+FROM sqlapply.sqlapply_history
+WHERE change_name = '%change_name';
\ No newline at end of file
@@ -0,0 +1,8 @@
+SELECT
+    CASE WHEN pg_has_role('pg_read_all_stats', 'USAGE') THEN coalesce(extract(epoch FROM max(replay_lag)), 0) END,
+    (
+        SELECT count(*)
+        FROM pg_stat_activity
+        WHERE state = 'active' AND backend_type = 'client backend' AND pid <> pg_backend_pid()
+    )
+FROM pg_stat_replication;
@@ -1 +0,0 @@
-SELECT * FROM sqlapply.sqlapply_history;
\ No newline at end of file
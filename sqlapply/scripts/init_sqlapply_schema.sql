@@ -62,4 +62,74 @@ BEGIN
 END
 $$;
 
-ALTER TABLE IF EXISTS sqlapply.sqlapply_history OWNER TO current_user;
\ No newline at end of file
+ALTER TABLE IF EXISTS sqlapply.sqlapply_history OWNER TO current_user;
+
+DO $$
+DECLARE
+    version INTEGER := coalesce(nullif(split_part(obj_description('sqlapply.sqlapply_history'::regclass, 'pg_class'), ':', 2), ''), '1')::INTEGER;
+BEGIN
+    IF version < 2 THEN
+        ALTER TABLE sqlapply.sqlapply_history ADD COLUMN IF NOT EXISTS duration_ms BIGINT;
+        ALTER TABLE sqlapply.sqlapply_history ADD COLUMN IF NOT EXISTS spawn_ms BIGINT;
+        ALTER TABLE sqlapply.sqlapply_history ADD COLUMN IF NOT EXISTS exec_ms BIGINT;
+        COMMENT ON TABLE sqlapply.sqlapply_history IS 'sqlapply:2';
+        RAISE NOTICE 'Table sqlapply.sqlapply_history upgraded to version 2.';
+    END IF;
+END
+$$;
+
+DO $$
+DECLARE
+    version INTEGER := coalesce(nullif(split_part(obj_description('sqlapply.sqlapply_history'::regclass, 'pg_class'), ':', 2), ''), '1')::INTEGER;
+BEGIN
+    IF version < 3 THEN
+        ALTER TABLE sqlapply.sqlapply_history ADD COLUMN IF NOT EXISTS stmt_index INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE sqlapply.sqlapply_history ADD COLUMN IF NOT EXISTS stmt_hash TEXT;
+        COMMENT ON TABLE sqlapply.sqlapply_history IS 'sqlapply:3';
+        RAISE NOTICE 'Table sqlapply.sqlapply_history upgraded to version 3.';
+    END IF;
+END
+$$;
+
+DO $$
+DECLARE
+    version INTEGER := coalesce(nullif(split_part(obj_description('sqlapply.sqlapply_history'::regclass, 'pg_class'), ':', 2), ''), '1')::INTEGER;
+BEGIN
+    IF version < 4 THEN
+        ALTER TABLE sqlapply.sqlapply_history ADD COLUMN IF NOT EXISTS batch_next BIGINT;
+        ALTER TABLE sqlapply.sqlapply_history ADD COLUMN IF NOT EXISTS batch_rows BIGINT NOT NULL DEFAULT 0;
+        COMMENT ON TABLE sqlapply.sqlapply_history IS 'sqlapply:4';
+        RAISE NOTICE 'Table sqlapply.sqlapply_history upgraded to version 4.';
+    END IF;
+END
+$$;
+
+DO $$
+DECLARE
+    version INTEGER := coalesce(nullif(split_part(obj_description('sqlapply.sqlapply_history'::regclass, 'pg_class'), ':', 2), ''), '1')::INTEGER;
+BEGIN
+    IF version < 5 THEN
+        ALTER TABLE sqlapply.sqlapply_history ADD COLUMN IF NOT EXISTS retries INTEGER NOT NULL DEFAULT 0;
+        COMMENT ON TABLE sqlapply.sqlapply_history IS 'sqlapply:5';
+        RAISE NOTICE 'Table sqlapply.sqlapply_history upgraded to version 5.';
+    END IF;
+END
+$$;
+
+DO $$
+DECLARE
+    version INTEGER := coalesce(nullif(split_part(obj_description('sqlapply.sqlapply_history'::regclass, 'pg_class'), ':', 2), ''), '1')::INTEGER;
+BEGIN
+    IF version < 6 THEN
+        CREATE TABLE IF NOT EXISTS sqlapply.sqlapply_applied (
+            change_name TEXT NOT NULL,
+            db TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (change_name, db)
+        );
+        COMMENT ON TABLE sqlapply.sqlapply_history IS 'sqlapply:6';
+        RAISE NOTICE 'Table sqlapply.sqlapply_history upgraded to version 6.';
+    END IF;
+END
+$$;
\ No newline at end of file
@@ -1,2 +0,0 @@
-INSERT INTO sqlapply.sqlapply_history (change_name, script_file, status, src_checksum)
-VALUES ('%change_name', '%script_file', '%status', '%src_checksum');
\ No newline at end of file
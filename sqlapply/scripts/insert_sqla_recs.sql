@@ -0,0 +1,7 @@
+INSERT INTO sqlapply.sqlapply_history (change_name, script_file, status, src_checksum)
+SELECT '%change_name', f.script_file, '%status', f.src_checksum
+FROM unnest(%script_files::text[], %src_checksums::text[]) AS f(script_file, src_checksum)
+ON CONFLICT (change_name, script_file) DO UPDATE
+SET
+    status = EXCLUDED.status,
+    src_checksum = EXCLUDED.src_checksum;
\ No newline at end of file
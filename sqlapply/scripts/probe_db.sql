@@ -0,0 +1,5 @@
+SELECT
+    to_regclass('sqlapply.sqlapply_history') IS NOT NULL,
+    coalesce(obj_description(to_regclass('sqlapply.sqlapply_history'), 'pg_class'), ''),
+    current_setting('server_version'),
+    current_user;
\ No newline at end of file
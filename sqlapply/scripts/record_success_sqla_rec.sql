@@ -0,0 +1,8 @@
+UPDATE sqlapply.sqlapply_history
+SET
+    status = 'SUCCESS',
+    src_checksum = '%new_hash',
+    exec_ms = (extract(epoch FROM clock_timestamp() - now()) * 1000)::BIGINT
+WHERE
+    change_name = '%change_name'
+    AND script_file = '%script_file';
\ No newline at end of file
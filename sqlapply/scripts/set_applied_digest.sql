@@ -0,0 +1,4 @@
+INSERT INTO sqlapply.sqlapply_applied (change_name, db, digest, applied_at)
+VALUES ('%change_name', '%target', '%digest', now())
+ON CONFLICT (change_name, db) DO UPDATE
+SET digest = EXCLUDED.digest, applied_at = EXCLUDED.applied_at;
\ No newline at end of file
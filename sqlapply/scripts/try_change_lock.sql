@@ -0,0 +1 @@
+SELECT pg_try_advisory_lock(hashtext('sqlapply'), hashtext('%change_name'));
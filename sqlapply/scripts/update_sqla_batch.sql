@@ -0,0 +1,7 @@
+UPDATE sqlapply.sqlapply_history
+SET
+    batch_next = %batch_next,
+    batch_rows = %batch_rows
+WHERE
+    change_name = '%change_name'
+    AND script_file = '%script_file';
\ No newline at end of file
@@ -0,0 +1,7 @@
+UPDATE sqlapply.sqlapply_history
+SET
+    stmt_index = %stmt_index,
+    stmt_hash = '%stmt_hash'
+WHERE
+    change_name = '%change_name'
+    AND script_file = '%script_file';
\ No newline at end of file
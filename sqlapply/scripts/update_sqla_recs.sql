@@ -0,0 +1,8 @@
+UPDATE sqlapply.sqlapply_history AS h
+SET
+    status = '%new_status',
+    src_checksum = f.src_checksum
+FROM unnest(%script_files::text[], %src_checksums::text[]) AS f(script_file, src_checksum)
+WHERE
+    h.change_name = '%change_name'
+    AND h.script_file = f.script_file;
\ No newline at end of file
@@ -0,0 +1,11 @@
+UPDATE sqlapply.sqlapply_history AS h
+SET
+    duration_ms = f.duration_ms,
+    spawn_ms = f.spawn_ms,
+    retries = f.retries
+FROM unnest(%script_files::text[], %durations::bigint[], %spawns::bigint[], %retries::integer[])
+    AS f(script_file, duration_ms, spawn_ms, retries)
+WHERE
+    h.change_name = '%change_name'
+    AND h.script_file = f.script_file
+RETURNING h.script_file, h.exec_ms;
\ No newline at end of file
@@ -0,0 +1,313 @@
+import io
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from .config import Config
+from .core import SQLApplyTool, DbLogFilter
+from .executor import connections
+from .history import SQLApplyError
+from .models import ExecMode, ForceMode
+
+
+ACTIONS = ("apply", "check", "show", "status")
+DONE = "done"
+SHUTDOWN_GRACE = 5.0
+
+
+class Job:
+    def __init__(self, key: str, request: dict):
+        self.key = key
+        self.request = request
+        self.started: float | None = None
+        self._lock = threading.Lock()
+        self._events: list[dict] = []
+        self._subscribers: list[queue.Queue] = []
+
+    def subscribe(self) -> queue.Queue:
+        q: queue.Queue = queue.Queue()
+        with self._lock:
+            for event in self._events:
+                q.put(event)
+            self._subscribers.append(q)
+        return q
+
+    def publish(self, event: dict):
+        with self._lock:
+            self._events.append(event)
+            for q in self._subscribers:
+                q.put(event)
+
+
+class _JobLogHandler(logging.Handler):
+    def __init__(self, job: Job):
+        super().__init__()
+        self.job = job
+        self.addFilter(DbLogFilter())
+        self.setFormatter(logging.Formatter("%(levelname)s - %(db_prefix)s%(message)s"))
+
+    def emit(self, record: logging.LogRecord):
+        self.job.publish({"event": "log", "level": record.levelname, "message": self.format(record)})
+
+
+def _validate(request: dict) -> str | None:
+    action = request.get("action")
+    if action not in ACTIONS:
+        return f"Unknown action '{action}', expected one of: {', '.join(ACTIONS)}"
+    if action != "status" and not request.get("change"):
+        return f"Action '{action}' needs a 'change'"
+    if request.get("mode", ExecMode.SINGLE_TRANSACTION.value) not in [m.value for m in ExecMode]:
+        return f"Unknown mode '{request['mode']}'"
+    if request.get("force") and request["force"].lower() not in [m.value for m in ForceMode]:
+        return f"Unknown force mode '{request['force']}'"
+    return None
+
+
+def _normalize(request: dict) -> dict:
+    if request["action"] == "show":
+        return {"action": "show", "change": request["change"], "pattern": request.get("pattern", "*.sql")}
+    force = request.get("force")
+    return {
+        "action": request["action"],
+        "change": request["change"],
+        "pattern": request.get("pattern", "*.sql"),
+        "mode": request.get("mode", ExecMode.SINGLE_TRANSACTION.value),
+        "force": force.lower() if force else None,
+        "parallel": int(request.get("parallel", 1)),
+        "fail_fast": bool(request.get("fail_fast", False)),
+        "script_parallelism": int(request.get("script_parallelism", 1)),
+        "verify_cache": bool(request.get("verify_cache", False)),
+        "profile": bool(request.get("profile", False)),
+        "canary": int(request.get("canary", 0)),
+    }
+
+
+class SQLApplyServer:
+    def __init__(self, config: Config, socket_path: Path):
+        self.config = config
+        self.socket_path = socket_path
+        self.tool = SQLApplyTool(config, keep_cache=True)
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._queue: queue.Queue[Job | None] = queue.Queue()
+        self._current: Job | None = None
+        self._closing = False
+        self._handlers: set[threading.Thread] = set()
+        self._started = time.time()
+        self._served = 0
+
+    def submit(self, request: dict) -> queue.Queue:
+        request = _normalize(request)
+        key = json.dumps(request, sort_keys=True)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = Job(key, request)
+                self._jobs[key] = job
+                self._queue.put(job)
+            return job.subscribe()
+
+    def status(self) -> dict:
+        with self._lock:
+            running = self._current.request if self._current else None
+            queued = [job.request for job in self._jobs.values() if job is not self._current]
+        return {
+            "event": "status",
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self._started, 1),
+            "served": self._served,
+            "running": running,
+            "queued": queued,
+            "databases": sorted(self.config.databases),
+        }
+
+    def _run(self, request: dict) -> bool:
+        action = request["action"]
+        change_name = request["change"]
+        pattern = request.get("pattern", "*.sql")
+
+        if action == "show":
+            buf = io.StringIO()
+            with redirect_stdout(buf):
+                self.tool.show_change(change_name, pattern)
+            for line in buf.getvalue().splitlines():
+                logging.info(line)
+            return True
+
+        return self.tool.execute_change(
+            change_name=change_name,
+            exec_mode=ExecMode(request["mode"]),
+            pattern=pattern,
+            force_mode=ForceMode(request["force"]) if request["force"] else None,
+            dry_run=action == "check",
+            parallel=request["parallel"],
+            fail_fast=request["fail_fast"],
+            script_parallelism=request["script_parallelism"],
+            verify_cache=request["verify_cache"],
+            profile=request["profile"],
+            canary=request["canary"],
+        )
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None or self._closing:
+                return
+            with self._lock:
+                self._current = job
+            job.started = time.time()
+            handler = _JobLogHandler(job)
+            logging.getLogger().addHandler(handler)
+            error = None
+            ok = False
+            try:
+                ok = self._run(job.request)
+            except SQLApplyError as e:
+                error = str(e)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                logging.exception(f"Request failed: {error}")
+            finally:
+                logging.getLogger().removeHandler(handler)
+                if error:
+                    logging.critical(error)
+                with self._lock:
+                    del self._jobs[job.key]
+                    self._current = None
+                    self._served += 1
+            job.publish({"event": DONE, "ok": ok, "error": error, "seconds": round(time.time() - job.started, 3)})
+
+    def _shutdown(self, worker: threading.Thread):
+        self._closing = True
+        self._queue.put(None)
+        while worker.is_alive():
+            self.tool.stop()
+            worker.join(0.5)
+
+        with self._lock:
+            pending = list(self._jobs.values())
+            self._jobs.clear()
+            handlers = list(self._handlers)
+        for job in pending:
+            job.publish({"event": DONE, "ok": False, "error": "sqlapply server is shutting down", "seconds": 0})
+        deadline = time.monotonic() + SHUTDOWN_GRACE
+        for thread in handlers:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def _handle(self, conn: socket.socket):
+        with self._lock:
+            self._handlers.add(threading.current_thread())
+        reader = conn.makefile("r", encoding="utf-8")
+        writer = conn.makefile("w", encoding="utf-8")
+
+        def _send(event: dict):
+            writer.write(json.dumps(event) + "\n")
+            writer.flush()
+
+        try:
+            try:
+                request = json.loads(reader.readline() or "{}")
+            except ValueError:
+                request = {}
+            error = _validate(request) if isinstance(request, dict) else "Request must be a JSON object"
+            if error:
+                _send({"event": DONE, "ok": False, "error": error})
+                return
+            if request["action"] == "status":
+                _send(self.status())
+                _send({"event": DONE, "ok": True, "error": None})
+                return
+
+            events = self.submit(request)
+            while True:
+                event = events.get()
+                _send(event)
+                if event["event"] == DONE:
+                    return
+        except OSError:
+            logging.debug("Client disconnected, its request keeps running")
+        finally:
+            for stream in (reader, writer):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+            with self._lock:
+                self._handlers.discard(threading.current_thread())
+
+    def _bind(self) -> socketserver.ThreadingUnixStreamServer:
+        if self.socket_path.exists():
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(self.socket_path))
+            except OSError:
+                self.socket_path.unlink()
+            else:
+                raise SQLApplyError(f"A server is already listening on '{self.socket_path}'")
+            finally:
+                probe.close()
+
+        handle = self._handle
+
+        class _Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                handle(self.request)
+
+        server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), _Handler)
+        server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+        return server
+
+    def serve_forever(self):
+        signal.signal(signal.SIGTERM, _interrupt)
+        server = self._bind()
+        logging.info(f"sqlapply server listening on '{self.socket_path}' (pid {os.getpid()})")
+        try:
+            with connections():
+                worker = threading.Thread(target=self._work, name="sqlapply-worker", daemon=True)
+                worker.start()
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    logging.info("Shutting down sqlapply server, waiting for the running request to stop")
+                    self._shutdown(worker)
+        finally:
+            server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+
+
+def _interrupt(_signum, _frame):
+    raise KeyboardInterrupt
+
+
+def request_remote(socket_path: Path, request: dict) -> bool:
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(str(socket_path))
+    except OSError as e:
+        raise SQLApplyError(f"Cannot connect to sqlapply server at '{socket_path}': {e}")
+
+    with conn, conn.makefile("r", encoding="utf-8") as reader:
+        conn.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        for line in reader:
+            event = json.loads(line)
+            if event["event"] == "log":
+                print(event["message"], flush=True)
+            elif event["event"] == "status":
+                print(json.dumps({k: v for k, v in event.items() if k != "event"}, indent=2))
+            elif event["event"] == DONE:
+                if event.get("error"):
+                    print(event["error"], file=sys.stderr)
+                return bool(event["ok"])
+
+    raise SQLApplyError("sqlapply server closed the connection before finishing the request")
@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import re
+import threading
+
+from hashlib import md5
+from pathlib import Path
+
+from .models import Script
+
+
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_\u0080-\uffff][\w\u0080-\uffff]*)?\$")
+_WORD = re.compile(r"[A-Za-z_\u0080-\uffff][\w$\u0080-\uffff]*")
+_LEADING_COMMENTS = re.compile(r"^(?:\s+|--[^\n]*|/\*.*?\*/)*", re.DOTALL)
+
+_TX_BEGIN = re.compile(r"^(BEGIN|START\s+TRANSACTION)\b(?!\s+ATOMIC)", re.IGNORECASE)
+_TX_END = re.compile(r"^(COMMIT|END|ROLLBACK|ABORT)\b(?!\s+PREPARED)", re.IGNORECASE)
+_NON_TRANSACTIONAL = re.compile(
+    r"^(VACUUM|CHECKPOINT|REINDEX\s+.*\bCONCURRENTLY\b"
+    r"|CREATE\s+(UNIQUE\s+)?INDEX\s+CONCURRENTLY|DROP\s+INDEX\s+CONCURRENTLY"
+    r"|(CREATE|DROP)\s+(DATABASE|TABLESPACE)|ALTER\s+SYSTEM|(COMMIT|ROLLBACK)\s+PREPARED"
+    r"|ALTER\s+TABLE\s+.*\bDETACH\s+PARTITION\b.*\bCONCURRENTLY\b)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def _is_ident(c: str) -> bool:
+    return c.isalnum() or c in "_$" or ord(c) >= 0x80
+
+
+def _skip_block_comment(text: str, i: int) -> int:
+    depth = 0
+    n = len(text)
+    while i < n:
+        if text.startswith("/*", i):
+            depth += 1
+            i += 2
+        elif text.startswith("*/", i):
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    return n + 1
+
+
+def _skip_line(text: str, i: int) -> int:
+    end = text.find("\n", i)
+    return len(text) if end < 0 else end
+
+
+def _skip_quoted(text: str, i: int, quote: str, backslash: bool) -> int:
+    n = len(text)
+    i += 1
+    while i < n:
+        c = text[i]
+        if backslash and c == "\\":
+            i += 2
+            continue
+        if c == quote:
+            if text.startswith(quote, i + 1):
+                i += 2
+                continue
+            return i + 1
+        i += 1
+    return n + 1
+
+
+def split_statements(text: str) -> list[tuple[int, int]]:
+    spans: list[tuple[int, int]] = []
+    n = len(text)
+    i = 0
+    start: int | None = None
+    prev_word = ""
+    atomic = 0
+
+    while i < n:
+        c = text[i]
+
+        if start is None:
+            if c.isspace() or c == ";":
+                i += 1
+                continue
+            if text.startswith("--", i):
+                i = _skip_line(text, i)
+                continue
+            if text.startswith("/*", i):
+                i = _skip_block_comment(text, i)
+                continue
+            if c == "\\":
+                end = _skip_line(text, i)
+                spans.append((i, len(text[:end].rstrip())))
+                i = end
+                continue
+            start = i
+            prev_word = ""
+            atomic = 0
+
+        if text.startswith("--", i):
+            i = _skip_line(text, i)
+        elif text.startswith("/*", i):
+            i = _skip_block_comment(text, i)
+        elif c == "'":
+            escaped = i > 0 and text[i - 1] in "eE" and (i < 2 or not _is_ident(text[i - 2]))
+            i = _skip_quoted(text, i, "'", escaped)
+        elif c == '"':
+            i = _skip_quoted(text, i, '"', False)
+        elif c == "$" and (i == 0 or not _is_ident(text[i - 1])) and (m := _DOLLAR_TAG.match(text, i)):
+            close = text.find(m.group(0), m.end())
+            i = n if close < 0 else close + len(m.group(0))
+        elif (c.isalpha() or c == "_") and (i == 0 or not _is_ident(text[i - 1])):
+            m = _WORD.match(text, i)
+            word = m.group(0).lower()
+            if atomic:
+                if word == "case":
+                    atomic += 1
+                elif word == "end":
+                    atomic -= 1
+            elif prev_word == "begin" and word == "atomic":
+                atomic = 1
+            prev_word = word
+            i = m.end()
+        elif c == ";" and not atomic:
+            spans.append((start, i + 1))
+            start = None
+            i += 1
+        else:
+            i += 1
+
+    if start is not None and text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    return spans
+
+
+def is_unterminated(statement: str) -> bool:
+    text = statement.strip()
+    if text.startswith("\\"):
+        return False
+
+    n = len(text)
+    i = 0
+    while i < n:
+        c = text[i]
+        if text.startswith("--", i):
+            i = _skip_line(text, i)
+        elif text.startswith("/*", i):
+            i = _skip_block_comment(text, i)
+        elif c == "'":
+            escaped = i > 0 and text[i - 1] in "eE" and (i < 2 or not _is_ident(text[i - 2]))
+            i = _skip_quoted(text, i, "'", escaped)
+        elif c == '"':
+            i = _skip_quoted(text, i, '"', False)
+        elif c == "$" and (i == 0 or not _is_ident(text[i - 1])) and (m := _DOLLAR_TAG.match(text, i)):
+            close = text.find(m.group(0), m.end())
+            i = n + 1 if close < 0 else close + len(m.group(0))
+        else:
+            i += 1
+    return i > n
+
+
+def statement_hash(statement: str) -> str:
+    return md5(statement.strip().encode("utf-8")).hexdigest()
+
+
+def _keyword_text(statement: str) -> str:
+    return statement[_LEADING_COMMENTS.match(statement).end():]
+
+
+def is_meta(statement: str) -> bool:
+    return statement.startswith("\\")
+
+
+def is_transactional(statement: str) -> bool:
+    return not is_meta(statement) and not _NON_TRANSACTIONAL.match(_keyword_text(statement))
+
+
+def transaction_units(statements: list[str], start: int = 0) -> list[tuple[int, int, bool]]:
+    units: list[tuple[int, int, bool]] = []
+    i = start
+    while i < len(statements):
+        if _TX_BEGIN.match(_keyword_text(statements[i])):
+            end = i + 1
+            while end < len(statements) and not _TX_END.match(_keyword_text(statements[end])):
+                end += 1
+            if end < len(statements):
+                units.append((i, end, True))
+                i = end + 1
+                continue
+        units.append((i, i, False))
+        i += 1
+    return units
+
+
+class SplitCache:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._memory: dict[str, list[tuple[int, int]]] = {}
+
+    def _load(self, checksum: str) -> list[tuple[int, int]] | None:
+        path = self.directory / f"{checksum}.json"
+        try:
+            return [tuple(span) for span in json.loads(path.read_text(encoding="utf-8"))]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logging.warning(f"Split cache entry '{path}' is unreadable, reparsing")
+            return None
+
+    def _save(self, checksum: str, spans: list[tuple[int, int]]):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.directory / f"{checksum}.json"
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(spans), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def get(self, script: Script) -> list[str]:
+        with open(script.path, encoding="utf-8") as f:
+            text = f.read()
+
+        checksum = script.checksum
+        with self._lock:
+            spans = self._memory.get(checksum)
+        if spans is None:
+            spans = self._load(checksum)
+            if spans is None:
+                spans = split_statements(text)
+                self._save(checksum, spans)
+            with self._lock:
+                self._memory[checksum] = spans
+
+        return [text[s:e] for s, e in spans]
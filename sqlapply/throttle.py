@@ -0,0 +1,71 @@
+import logging
+import time
+
+from typing import Callable
+
+from .config import DbConfig
+from .models import LoadSample
+from .history import probe_load
+
+
+LoadProbe = Callable[[DbConfig], LoadSample | None]
+
+
+class Throttle:
+    def __init__(
+        self,
+        db: DbConfig,
+        probe: LoadProbe = probe_load,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.db = db
+        self.probe = probe
+        self.sleep = sleep
+        self.clock = clock
+        self.enabled = bool(db.max_replica_lag or db.max_active_backends)
+        self._lag_warned = False
+
+    def _reason(self, sample: LoadSample) -> str | None:
+        if self.db.max_replica_lag and sample.replica_lag is None and not self._lag_warned:
+            logging.warning(
+                f"Replica lag of '{self.db.dbname}' is not visible to this role, "
+                "'max_replica_lag' is ignored (grant pg_monitor to enable it)"
+            )
+            self._lag_warned = True
+        if self.db.max_replica_lag and sample.replica_lag is not None and sample.replica_lag > self.db.max_replica_lag:
+            return f"replica lag {sample.replica_lag:.1f}s > {self.db.max_replica_lag:g}s"
+        if self.db.max_active_backends and sample.active_backends > self.db.max_active_backends:
+            return f"{sample.active_backends} active backends > {self.db.max_active_backends}"
+        return None
+
+    def wait(self, label: str, should_stop: Callable[[], bool] = lambda: False) -> float:
+        if not self.enabled:
+            return 0.0
+
+        started = self.clock()
+        throttled = False
+        while not should_stop():
+            sample = self.probe(self.db)
+            if sample is None:
+                logging.warning(f"Load of '{self.db.dbname}' is unavailable, throttling disabled")
+                self.enabled = False
+                break
+
+            reason = self._reason(sample)
+            if reason is None:
+                break
+            if not throttled:
+                logging.warning(f"Pausing before {label}: {reason}")
+                throttled = True
+            else:
+                logging.debug(f"Still pausing before {label}: {reason}")
+
+            deadline = self.clock() + self.db.throttle_poll
+            while not should_stop() and self.clock() < deadline:
+                self.sleep(min(deadline - self.clock(), 0.2))
+
+        paused = self.clock() - started
+        if throttled:
+            logging.info(f"Resuming {label} after a {paused:.1f}s pause")
+        return paused if throttled else 0.0
@@ -0,0 +1,168 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+
+from pathlib import Path
+from typing import Callable
+
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+POLL_INTERVAL = 0.5
+MAX_DEBOUNCE_FACTOR = 10
+
+
+def _ignored(name: str) -> bool:
+    return name.startswith(".") or name.endswith("~")
+
+
+class Watcher:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _poll(self, timeout: float) -> set[str]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> "Watcher":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def wait(self, debounce: float, should_stop: Callable[[], bool] = lambda: False) -> set[str]:
+        changed: set[str] = set()
+        while not changed:
+            if should_stop():
+                return changed
+            changed = self._poll(0.2)
+
+        now = time.monotonic()
+        quiet, limit = now + debounce, now + debounce * MAX_DEBOUNCE_FACTOR
+        while not should_stop() and (now := time.monotonic()) < min(quiet, limit):
+            more = self._poll(min(quiet, limit) - now)
+            if more:
+                changed |= more
+                quiet = time.monotonic() + debounce
+        return changed
+
+
+class InotifyWatcher(Watcher):
+    def __init__(self, root: Path):
+        super().__init__(root)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, str] = {}
+        try:
+            self._add(root, "")
+            for entry in root.iterdir():
+                if entry.is_dir():
+                    self._add(entry, entry.name)
+        except OSError:
+            self.close()
+            raise
+
+    def _add(self, path: Path, name: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Cannot watch '{path}': {os.strerror(errno)}")
+        self._dirs[wd] = name
+
+    def _poll(self, timeout: float) -> set[str]:
+        ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed: set[str] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            parent = self._dirs.get(wd)
+            if parent is None or not name or _ignored(name):
+                continue
+            if parent:
+                changed.add(parent)
+            elif mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._add(self.root / name, name)
+                    except OSError as e:
+                        logging.warning(str(e))
+                changed.add(name)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(Watcher):
+    def __init__(self, root: Path, interval: float = POLL_INTERVAL):
+        super().__init__(root)
+        self.interval = interval
+        self._next = time.monotonic() + interval
+        self._state = self._scan()
+
+    def _scan(self) -> dict[str, dict[str, tuple[int, int, int]]]:
+        state: dict[str, dict[str, tuple[int, int, int]]] = {}
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or _ignored(entry.name):
+                continue
+            files: dict[str, tuple[int, int, int]] = {}
+            try:
+                for f in os.scandir(entry.path):
+                    if not _ignored(f.name) and f.is_file():
+                        st = f.stat()
+                        files[f.name] = (st.st_size, st.st_mtime_ns, st.st_ino)
+            except FileNotFoundError:
+                continue
+            state[entry.name] = files
+        return state
+
+    def _poll(self, timeout: float) -> set[str]:
+        delay = self._next - time.monotonic()
+        if delay > timeout:
+            time.sleep(max(timeout, 0))
+            return set()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = time.monotonic() + self.interval
+
+        state = self._scan()
+        changed = {name for name in state.keys() | self._state.keys() if state.get(name) != self._state.get(name)}
+        self._state = state
+        return changed
+
+
+def open_watcher(root: Path) -> Watcher:
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError) as e:
+        logging.info(f"inotify is unavailable ({e}), polling '{root}' every {POLL_INTERVAL:g}s")
+        return PollingWatcher(root)
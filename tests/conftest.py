@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+from pathlib import Path
+
+import pytest
+
+from sqlapply import history
+from sqlapply.config import DbConfig
+
+
+FAKE_PSQL = Path(__file__).resolve().parent.parent / "benchmarks" / "fake_psql.py"
+
+
+class FakePsql:
+    def __init__(self, state: Path):
+        self.state = state
+        self.db = DbConfig(dbname="fake_db")
+
+    def init(self) -> DbConfig:
+        history.init_db(self.db)
+        return self.db
+
+    def records(self) -> dict:
+        data = json.loads(self.state.read_text(encoding="utf-8"))
+        return data[self.db.dbname]["hist"]
+
+
+@pytest.fixture
+def fake_psql(tmp_path, monkeypatch) -> FakePsql:
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    wrapper = bin_dir / "psql"
+    wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_PSQL}" "$@"\n', encoding="utf-8")
+    wrapper.chmod(0o755)
+
+    state = tmp_path / "fake_psql_state.json"
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_PSQL_STATE", str(state))
+    return FakePsql(state)
@@ -0,0 +1,26 @@
+from sqlapply.baseline import Baselines, RunRecordStore
+from sqlapply.models import PsqlResult
+
+
+def _result(duration: float, returncode: int = 0) -> PsqlResult:
+    return PsqlResult(stdout="", stderr="", combined="", returncode=returncode, duration=duration)
+
+
+def test_baselines_are_kept_per_section(tmp_path):
+    store = RunRecordStore(tmp_path / "run_records.jsonl")
+    store.append("release", "orders", "orders", {"01.sql": _result(1.0)})
+    store.append("release", "users", "users", {"01.sql": _result(9.0)})
+    store.append("release", "users", "users", {"01.sql": _result(30.0, returncode=3)})
+    store.append("other", "orders", "orders", {"01.sql": _result(50.0)})
+
+    baselines = Baselines(store.load("release"))
+    assert baselines.expected("orders", "01.sql") == 1.0
+    assert baselines.expected("users", "01.sql") == 9.0
+    assert baselines.expected("billing", "01.sql") is None
+
+
+def test_fleet_targets_share_their_section_baseline(tmp_path):
+    store = RunRecordStore(tmp_path / "run_records.jsonl")
+    store.append("release", "shard01", "shards", {"01.sql": _result(2.0)})
+    store.append("release", "shard02", "shards", {"01.sql": _result(4.0)})
+    assert Baselines(store.load("release")).expected("shards", "01.sql") == 3.0
@@ -0,0 +1,29 @@
+import threading
+
+from sqlapply.cache import ChecksumCache
+from sqlapply.models import Script
+
+
+def test_concurrent_saves_share_one_cache_file(tmp_path):
+    script = tmp_path / "01.sql"
+    script.write_text("SELECT 1;", encoding="utf-8")
+    path = tmp_path / "checksum_cache.json"
+    errors = []
+
+    def _save():
+        cache = ChecksumCache(path)
+        cache.fill([Script(name=script.name, path=script)])
+        try:
+            cache.save()
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert not list(tmp_path.glob("*.tmp"))
+    assert ChecksumCache(path).lookup(script) == Script(name=script.name, path=script).checksum
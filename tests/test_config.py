@@ -0,0 +1,30 @@
+import pytest
+
+from sqlapply.config import DbConfig, expand_fleet, expand_ranges
+
+
+@pytest.mark.parametrize("text, expanded", [
+    ("shard", ["shard"]),
+    ("shard{1..3}", ["shard1", "shard2", "shard3"]),
+    ("shard{08..10}", ["shard08", "shard09", "shard10"]),
+    ("shard{3..1}", ["shard3", "shard2", "shard1"]),
+    ("s{1..2}r{1..2}", ["s1r1", "s1r2", "s2r1", "s2r2"]),
+])
+def test_expand_ranges(text, expanded):
+    assert expand_ranges(text) == expanded
+
+
+def test_expand_fleet_inherits_base_settings():
+    base = DbConfig(dbname="ignored", host="primary", port=5432, user="deployer", max_replica_lag=10)
+    targets = expand_fleet("shard{01..02}, replica:6432/shard03", base)
+
+    assert list(targets) == ["shard01", "shard02", "shard03@replica"]
+    assert (targets["shard01"].host, targets["shard01"].port) == ("primary", 5432)
+    assert (targets["shard03@replica"].host, targets["shard03@replica"].port) == ("replica", 6432)
+    assert all(db.user == "deployer" and db.max_replica_lag == 10 for db in targets.values())
+
+
+@pytest.mark.parametrize("spec", ["host:port/db", "host/", "shard1, shard{1..2}"])
+def test_expand_fleet_rejects_invalid_targets(spec):
+    with pytest.raises(ValueError):
+        expand_fleet(spec, DbConfig(dbname="base"))
@@ -0,0 +1,10 @@
+import pytest
+
+from sqlapply.core import LOCK_RETRY_MAX_DELAY, SQLApplyTool
+
+
+@pytest.mark.parametrize("attempt, cap", [(1, 2.0), (2, 4.0), (3, 8.0), (10, LOCK_RETRY_MAX_DELAY)])
+def test_backoff_doubles_with_jitter_up_to_the_cap(attempt, cap):
+    delays = [SQLApplyTool._backoff(2.0, attempt) for _ in range(200)]
+    assert all(cap / 2 <= delay <= cap for delay in delays)
+    assert len(set(delays)) > 1
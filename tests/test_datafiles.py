@@ -0,0 +1,26 @@
+import pytest
+
+from sqlapply.core import load_scripts
+from sqlapply.datafiles import COPY_CONFIG, matches_pattern
+
+
+@pytest.mark.parametrize("name, pattern, expected", [
+    ("02_users.csv.gz", "*.sql", True),
+    ("02_users.csv", "02_*.sql", True),
+    ("02_users.tsv", "01_*.sql", False),
+    ("02_users.csv", "*.csv", True),
+    ("02_users.csv", "*", True),
+])
+def test_matches_pattern(name, pattern, expected):
+    assert matches_pattern(name, pattern) is expected
+
+
+def test_load_scripts_keeps_data_files_out_of_the_glob(tmp_path):
+    (tmp_path / "01_schema.sql").write_text("CREATE TABLE users (id int);", encoding="utf-8")
+    (tmp_path / "02_users.csv").write_text("1\n", encoding="utf-8")
+    (tmp_path / COPY_CONFIG).write_text("[02_users.csv]\ntable = users\n", encoding="utf-8")
+
+    scripts = load_scripts(str(tmp_path), "*")
+    assert [(s.name, s.copy is not None) for s in scripts] == [("01_schema.sql", False), ("02_users.csv", True)]
+    assert [s.name for s in load_scripts(str(tmp_path), "01_*.sql")] == ["01_schema.sql"]
+    assert [s.name for s in load_scripts(str(tmp_path))] == ["01_schema.sql", "02_users.csv"]
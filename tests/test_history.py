@@ -0,0 +1,169 @@
+import re
+
+from pathlib import Path
+
+import pytest
+
+from sqlapply import history
+from sqlapply.config import DbConfig
+from sqlapply.executor import Executor, render_bind, render_literal
+from sqlapply.models import BatchSpec, PsqlResult, ScriptState
+from sqlapply.splitter import split_statements, statement_hash
+
+
+QUERIES = sorted(set(re.findall(r'_query\(\s*\w+,\s*"(\w+\.sql)"', Path(history.__file__).read_text(encoding="utf-8"))))
+
+
+class DigestExecutor(Executor):
+    def __init__(self, bind: bool):
+        self.bind = bind
+        self.rows: dict[tuple[str, str], str] = {}
+
+    def query(self, db: DbConfig, template: str, args: str = "", **params: str | list[str]) -> PsqlResult:
+        sql = render_bind(template) if self.bind else render_literal(template, params)
+        if self.bind and len(split_statements(sql)) != 1:
+            message = "ERROR:  cannot insert multiple commands into a prepared statement"
+            return PsqlResult(stdout="", stderr=message, combined=message, returncode=3)
+
+        key = (params["change_name"], params["target"])
+        if template == history._sql("set_applied_digest.sql"):
+            self.rows[key] = params["digest"]
+            return PsqlResult(stdout="", stderr="", combined="", returncode=0)
+        out = self.rows.get(key, "")
+        return PsqlResult(stdout=out, stderr="", combined=out, returncode=0)
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_query_templates_bind_as_one_statement(name):
+    assert len(split_statements(render_bind(history._sql(name)))) == 1
+
+
+@pytest.mark.parametrize("bind", [False, True], ids=["psql", "native"])
+def test_applied_digest_roundtrip(monkeypatch, bind):
+    executor = DigestExecutor(bind)
+    monkeypatch.setattr(history, "get_executor", lambda db: executor)
+    dbs = {"shard01": DbConfig(dbname="shard01"), "shard02": DbConfig(dbname="shard02")}
+
+    history.set_applied_digest(dbs["shard01"], "release", "shard01", "abc")
+    assert history.applied_digests(dbs, "release") == {"shard01": "abc"}
+
+    history.set_applied_digest(dbs["shard01"], "release", "shard01", "")
+    assert history.applied_digests(dbs, "release") == {}
+
+
+def test_copy_lock_timeout_is_a_retryable_script_error(monkeypatch):
+    stderr = "ERROR:  canceling statement due to lock timeout"
+    monkeypatch.setattr(
+        history, "exec_copy",
+        lambda *args, **kwargs: PsqlResult(stdout="", stderr=stderr, combined=stderr, returncode=1),
+    )
+    result = history.exec_copied(DbConfig(dbname="db"), "release", "t.csv", "hash", "COPY t FROM STDIN", None)
+    assert result.status.value == "SCRIPT_ERROR"
+    assert history.is_lock_timeout(result)
+
+
+def test_copy_read_error_stays_fatal(monkeypatch):
+    stderr = "sqlapply: cannot read data file: unexpected end of data"
+    monkeypatch.setattr(
+        history, "exec_copy",
+        lambda *args, **kwargs: PsqlResult(stdout="", stderr=stderr, combined=stderr, returncode=1),
+    )
+    result = history.exec_copied(DbConfig(dbname="db"), "release", "t.csv", "hash", "COPY t FROM STDIN", None)
+    assert result.status.value == "PSQL_FATAL_ERROR"
+    assert not history.is_lock_timeout(result)
+
+
+@pytest.mark.parametrize("stderr, returncode, expected", [
+    ("ERROR:  canceling statement due to lock timeout", 3, True),
+    ("ERROR:  could not obtain lock on relation \"orders\"", 3, True),
+    ("ERROR:  55P03: lock_not_available", 1, True),
+    ("ERROR:  canceling statement due to statement timeout", 3, False),
+    ("psql: error: canceling statement due to lock timeout", 2, False),
+])
+def test_is_lock_timeout(stderr, returncode, expected):
+    assert history.is_lock_timeout(PsqlResult(stdout="", stderr=stderr, combined=stderr, returncode=returncode)) is expected
+
+
+@pytest.mark.parametrize("statement", ["SELECT 1 -- trailing note", "SELECT 1", "SELECT 1;"])
+def test_terminator_stays_outside_trailing_comments(statement):
+    text = history._terminated(statement) + "\nUPDATE t SET x = 1;"
+    assert len(split_statements(text)) == 2
+
+
+def test_load_history_reads_back_recorded_scripts(fake_psql):
+    db = fake_psql.init()
+    history.insert_records(db, "release", [("01.sql", "aaa"), ("02.sql", "bbb")])
+    history.update_records(db, "release", "SUCCESS", [("01.sql", "aaa")])
+    history.insert_records(db, "other", [("01.sql", "ccc")])
+
+    records = history.load_history(db, "release")
+    assert sorted(records) == ["01.sql", "02.sql"]
+    assert (records["01.sql"].status, records["01.sql"].src_checksum) == ("SUCCESS", "aaa")
+    assert records["02.sql"].state == ScriptState.IN_PROGRESS
+    assert (records["02.sql"].stmt_index, records["02.sql"].batch_next, records["02.sql"].duration_ms) == (0, None, None)
+
+
+def test_load_history_parses_pipes_in_script_names(monkeypatch):
+    stdout = "\nodd|name.sql|SUCCESS|abc|2024-01-01 00:00:00|1500|3|h3|-5|42\n"
+    monkeypatch.setattr(
+        history, "_query", lambda *args, **kwargs: PsqlResult(stdout=stdout, stderr="", combined=stdout, returncode=0),
+    )
+    record = history.load_history(DbConfig(dbname="db"), "release")["odd|name.sql"]
+    assert (record.duration_ms, record.stmt_index, record.stmt_hash) == (1500, 3, "h3")
+    assert (record.batch_next, record.batch_rows) == (-5, 42)
+
+
+def test_checkpointed_run_resumes_after_the_failed_statement(fake_psql):
+    db = fake_psql.init()
+    history.insert_records(db, "release", [("01.sql", "abc")])
+    statements = ["INSERT INTO t VALUES (1);", "SELECT * FROM fake_error;", "INSERT INTO t VALUES (3) -- last"]
+
+    failed = history.exec_checkpointed(db, "release", "01.sql", statements)
+    assert failed.returncode == 3
+    assert history.load_history(db, "release")["01.sql"].stmt_index == 1
+
+    statements[1] = "INSERT INTO t VALUES (2);"
+    resumed = history.exec_checkpointed(db, "release", "01.sql", statements, start=1)
+    assert resumed.ok
+    assert "VALUES (1)" not in resumed.stdout and "VALUES (2)" in resumed.stdout
+    record = history.load_history(db, "release")["01.sql"]
+    assert (record.stmt_index, record.stmt_hash) == (3, statement_hash(statements[2]))
+
+
+def _batched_script(tmp_path) -> Path:
+    path = tmp_path / "01.sql"
+    path.write_text("UPDATE big SET flag = true WHERE id >= :batch_start AND id < :batch_end;\n", encoding="utf-8")
+    return path
+
+
+def test_batched_run_covers_the_key_range(fake_psql, tmp_path):
+    db = fake_psql.init()
+    history.insert_records(db, "release", [("01.sql", "abc")])
+    spec = BatchSpec(table="big", key="id", size=300)
+
+    result, done = history.exec_batched(db, "release", "01.sql", _batched_script(tmp_path), spec)
+    assert result.ok and done
+    assert result.stdout.count("-- batch id") == 4
+    record = history.load_history(db, "release")["01.sql"]
+    assert (record.batch_next, record.batch_rows) == (1001, 1000)
+
+
+def test_batched_run_stops_and_resumes_between_batches(fake_psql, tmp_path):
+    db = fake_psql.init()
+    history.insert_records(db, "release", [("01.sql", "abc")])
+    spec = BatchSpec(table="big", key="id", size=300)
+    path = _batched_script(tmp_path)
+    batches = []
+
+    result, done = history.exec_batched(
+        db, "release", "01.sql", path, spec, pause=lambda: batches.append(1), should_stop=lambda: bool(batches),
+    )
+    assert result.ok and not done
+    record = history.load_history(db, "release")["01.sql"]
+    assert (record.batch_next, record.batch_rows) == (301, 300)
+
+    result, done = history.exec_batched(db, "release", "01.sql", path, spec, resume=(record.batch_next, record.batch_rows))
+    assert result.ok and done
+    assert "id >= 1 AND" not in result.stdout
+    record = history.load_history(db, "release")["01.sql"]
+    assert (record.batch_next, record.batch_rows) == (1001, 1000)
@@ -0,0 +1,53 @@
+from sqlapply.manifest import ChangeManifest, script_digest
+from sqlapply.models import Script
+
+
+def _db_dir(tmp_path, *names: str):
+    db_dir = tmp_path / "db1"
+    db_dir.mkdir()
+    for name in names:
+        (db_dir / name).write_text(f"SELECT '{name}';", encoding="utf-8")
+    return db_dir
+
+
+def _scripts(db_dir) -> list[Script]:
+    return [Script(name=path.name, path=path) for path in sorted(db_dir.glob("*.sql"))]
+
+
+def test_script_digest_covers_names_and_contents(tmp_path):
+    db_dir = _db_dir(tmp_path, "01.sql", "02.sql")
+    scripts = _scripts(db_dir)
+    digest = script_digest(scripts)
+
+    assert script_digest(_scripts(db_dir)) == digest
+    assert script_digest(scripts[:1]) != digest
+    (db_dir / "02.sql").write_text("SELECT 2;", encoding="utf-8")
+    assert script_digest(_scripts(db_dir)) != digest
+
+
+def test_manifest_reuses_digest_until_files_change(tmp_path):
+    db_dir = _db_dir(tmp_path, "01.sql", "02.sql")
+    manifest = ChangeManifest(tmp_path)
+    assert manifest.digest(db_dir, "*.sql") is None
+
+    digest = manifest.update(db_dir, "*.sql", _scripts(db_dir))
+    manifest.save()
+    assert not list(tmp_path.glob("*.tmp"))
+
+    reloaded = ChangeManifest(tmp_path)
+    assert reloaded.digest(db_dir, "*.sql") == digest
+    assert reloaded.digest(db_dir, "01*.sql") is None
+    assert reloaded.count(db_dir) == 2
+
+    (db_dir / "03.sql").write_text("SELECT 3;", encoding="utf-8")
+    assert ChangeManifest(tmp_path).digest(db_dir, "*.sql") is None
+
+
+def test_unreadable_manifest_is_rebuilt(tmp_path):
+    db_dir = _db_dir(tmp_path, "01.sql")
+    manifest = ChangeManifest(tmp_path)
+    manifest.path.write_text("{not json", encoding="utf-8")
+
+    manifest = ChangeManifest(tmp_path)
+    assert manifest.digest(db_dir, "*.sql") is None
+    assert manifest.update(db_dir, "*.sql", _scripts(db_dir)) == script_digest(_scripts(db_dir))
@@ -0,0 +1,75 @@
+import pytest
+
+from sqlapply.history import SQLApplyError
+from sqlapply.models import Script
+from sqlapply.plan import build_graph, build_waves, contract_graph, read_batch_spec
+
+
+def _scripts(tmp_path, sources: dict[str, str]) -> list[Script]:
+    scripts = []
+    for name, text in sources.items():
+        path = tmp_path / name
+        path.write_text(text, encoding="utf-8")
+        scripts.append(Script(name=name, path=path))
+    return scripts
+
+
+def test_scripts_without_headers_run_in_order(tmp_path):
+    scripts = _scripts(tmp_path, {"01.sql": "SELECT 1;", "02.sql": "SELECT 2;", "03.sql": "SELECT 3;"})
+    graph = build_graph(scripts)
+    assert graph == {"01.sql": [], "02.sql": ["01.sql"], "03.sql": ["02.sql"]}
+    assert build_waves(graph) == [["01.sql"], ["02.sql"], ["03.sql"]]
+
+
+def test_depends_on_headers_build_parallel_waves(tmp_path):
+    scripts = _scripts(tmp_path, {
+        "01_schema.sql": "CREATE SCHEMA app;",
+        "02_orders.sql": "-- sqlapply: depends-on 01_schema.sql\nCREATE TABLE app.orders ();",
+        "03_users.sql": "-- sqlapply: depends-on 01_schema.sql\nCREATE TABLE app.users ();",
+        "04_fk.sql": "-- sqlapply: depends-on 02_orders.sql, 03_users.sql, missing.sql\nSELECT 1;",
+    })
+    graph = build_graph(scripts)
+    assert graph["04_fk.sql"] == ["02_orders.sql", "03_users.sql"]
+    assert build_waves(graph) == [["01_schema.sql"], ["02_orders.sql", "03_users.sql"], ["04_fk.sql"]]
+
+
+def test_dependency_cycle_is_rejected(tmp_path):
+    scripts = _scripts(tmp_path, {
+        "01.sql": "-- sqlapply: depends-on 02.sql\nSELECT 1;",
+        "02.sql": "-- sqlapply: depends-on 01.sql\nSELECT 2;",
+    })
+    with pytest.raises(SQLApplyError, match="cycle"):
+        build_graph(scripts)
+
+
+def test_contracting_unchanged_scripts_keeps_transitive_order(tmp_path):
+    scripts = _scripts(tmp_path, {"01.sql": "SELECT 1;", "02.sql": "SELECT 2;", "03.sql": "SELECT 3;"})
+    graph = contract_graph(build_graph(scripts), {"02.sql"})
+    assert graph == {"01.sql": [], "03.sql": ["01.sql"]}
+    assert build_waves(graph) == [["01.sql"], ["03.sql"]]
+
+
+def test_contracting_merges_dependencies_of_removed_scripts(tmp_path):
+    graph = {"a": [], "b": [], "c": ["a", "b"], "d": ["c", "a"], "e": ["d"]}
+    assert contract_graph(graph, {"c", "d"}) == {"a": [], "b": [], "e": ["a", "b"]}
+
+
+def test_batch_spec_is_read_from_the_header(tmp_path):
+    [script] = _scripts(tmp_path, {"01.sql": (
+        "-- sqlapply: batch table=big_table key=id size=500 sleep=0.5\n"
+        "UPDATE big_table SET flag = true WHERE id >= :batch_start AND id < :'batch_end';"
+    )})
+    spec = read_batch_spec(script)
+    assert (spec.table, spec.key, spec.size, spec.sleep) == ("big_table", "id", 500, 0.5)
+
+
+@pytest.mark.parametrize("text, error", [
+    ("-- sqlapply: batch table=t key=id\nUPDATE t SET flag = true;", ":batch_start and :batch_end"),
+    ("-- sqlapply: batch table=t key=id\nUPDATE t SET flag = true WHERE id >= :batch_start;", ":batch_end"),
+    ("-- sqlapply: batch table=t key=id size=0\nUPDATE t SET flag = true;", "size"),
+    ("-- sqlapply: batch table=t;drop key=id\nSELECT 1;", "table"),
+])
+def test_invalid_batch_scripts_are_rejected(tmp_path, text, error):
+    [script] = _scripts(tmp_path, {"01.sql": text})
+    with pytest.raises(SQLApplyError, match=error):
+        read_batch_spec(script)
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from sqlapply import history
+from sqlapply.config import DbConfig, timeout_seconds
+from sqlapply.executor import render_literal
+from sqlapply.psql import SESSION_GRACE, STDOUT, PsqlSession, _pump, session_timeout, sessions
+
+
+@pytest.mark.parametrize("value, seconds", [("500", 0.5), ("250ms", 0.25), ("5s", 5.0), ("2min", 120.0), ("1h", 3600.0)])
+def test_timeout_seconds(value, seconds):
+    assert timeout_seconds(value) == pytest.approx(seconds)
+
+
+def test_session_timeout_follows_statement_timeout():
+    db = DbConfig(dbname="db", connect_timeout=10)
+    assert session_timeout(db, "-c lock_timeout=5s -c statement_timeout=1min") == 60 + 10 + SESSION_GRACE
+    assert session_timeout(db, "-c lock_timeout=5s") is None
+    assert session_timeout(db, "-c statement_timeout=0") is None
+
+
+def test_pump_gives_up_after_read_timeout():
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(read_fd, "rb") as reader, os.fdopen(write_fd, "wb") as writer:
+        writer.write(b"partial\n")
+        writer.flush()
+        lines = []
+        assert _pump({reader: STDOUT}, lambda stream, line: lines.append(line) is None, timeout=0.2) is False
+        assert lines == ["partial"]
+
+
+def test_session_frames_each_request(fake_psql):
+    session = PsqlSession(fake_psql.init())
+    try:
+        first = session.execute("\\echo one\n\\echo two")
+        failed = session.execute("SELECT * FROM fake_error")
+        after = session.execute("\\echo after")
+    finally:
+        session.close()
+
+    assert (first.returncode, first.stdout, first.stderr) == (0, "one\ntwo", "")
+    assert failed.returncode == 3 and "fake_error" in failed.stderr
+    assert (after.returncode, after.stdout, after.stderr) == (0, "after", "")
+
+
+def test_session_single_transaction_rolls_back_on_error(fake_psql):
+    db = fake_psql.init()
+    insert = render_literal(history._sql("insert_sqla_recs.sql"), {
+        "change_name": "release", "status": "IN_PROGRESS", "script_files": ["01.sql"], "src_checksums": ["abc"],
+    })
+    session = PsqlSession(db)
+    try:
+        assert session.execute(f"{insert};\nSELECT * FROM fake_error;", single_transaction=True).returncode == 3
+        assert session.execute(insert, single_transaction=True).ok
+    finally:
+        session.close()
+    assert list(fake_psql.records()) == ["release\x0001.sql"]
+
+
+def test_history_queries_share_one_session(fake_psql, tmp_path, monkeypatch):
+    db = fake_psql.init()
+    spawns = tmp_path / "spawns"
+    monkeypatch.setenv("FAKE_PSQL_SPAWNS", str(spawns))
+    with sessions():
+        for change in ("a", "b", "c"):
+            assert history.load_history(db, change) == {}
+    assert spawns.read_text(encoding="utf-8").splitlines() == [db.dbname]
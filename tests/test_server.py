@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from sqlapply.config import Config
+from sqlapply.server import DONE, SQLApplyServer
+
+
+@pytest.fixture
+def server(tmp_path) -> SQLApplyServer:
+    return SQLApplyServer(Config(logs_dir=tmp_path / "logs", changes_dir=tmp_path), tmp_path / "sqlapply.sock")
+
+
+def _events(events) -> list[dict]:
+    out = []
+    while not out or out[-1]["event"] != DONE:
+        out.append(events.get(timeout=5))
+    return out
+
+
+def test_equivalent_requests_join_one_job(server):
+    server.submit({"action": "check", "change": "release"})
+    server.submit({"action": "check", "change": "release", "mode": "single-transaction", "parallel": 1})
+    server.submit({"action": "apply", "change": "release"})
+    server.submit({"action": "check", "change": "release", "force": "ALL"})
+
+    assert server._queue.qsize() == 3
+    assert [(r["action"], r["force"]) for r in server.status()["queued"]] == [
+        ("check", None), ("apply", None), ("check", "all"),
+    ]
+
+
+def test_joined_requests_receive_the_same_events(server):
+    started = threading.Event()
+
+    def _run(request: dict) -> bool:
+        started.wait(5)
+        logging.warning(f"running {request['change']}")
+        return True
+
+    server._run = _run
+    first = server.submit({"action": "apply", "change": "release"})
+    second = server.submit({"action": "apply", "change": "release"})
+    worker = threading.Thread(target=server._work, daemon=True)
+    worker.start()
+    started.set()
+
+    events = _events(first)
+    assert _events(second) == events
+    assert any(e["event"] == "log" and "running release" in e["message"] for e in events)
+    assert events[-1]["ok"] is True
+    server._shutdown(worker)
+    assert not worker.is_alive()
+
+
+def test_shutdown_stops_the_running_request_and_fails_queued_ones(server):
+    def _run(request: dict) -> bool:
+        while not server.tool._stop:
+            time.sleep(0.01)
+        return False
+
+    server._run = _run
+    running = server.submit({"action": "apply", "change": "first"})
+    queued = server.submit({"action": "apply", "change": "second"})
+    worker = threading.Thread(target=server._work, daemon=True)
+    worker.start()
+    while server.status()["running"] is None:
+        time.sleep(0.01)
+
+    server._shutdown(worker)
+    assert not worker.is_alive()
+    assert _events(running)[-1] == {"event": DONE, "ok": False, "error": None, "seconds": pytest.approx(0, abs=5)}
+    assert _events(queued)[-1]["error"] == "sqlapply server is shutting down"
@@ -0,0 +1,47 @@
+import pytest
+
+from sqlapply.splitter import is_unterminated, split_statements
+
+
+def _split(text: str) -> list[str]:
+    return [text[start:end] for start, end in split_statements(text)]
+
+
+def test_split_keeps_quoted_semicolons():
+    text = "INSERT INTO t VALUES ('a;b');\nSELECT $$x; y$$;\nSELECT 1 /* ; */;"
+    assert _split(text) == ["INSERT INTO t VALUES ('a;b');", "SELECT $$x; y$$;", "SELECT 1 /* ; */;"]
+
+
+def test_split_keeps_begin_atomic_body_together():
+    text = (
+        "CREATE FUNCTION f() RETURNS int LANGUAGE sql BEGIN ATOMIC SELECT CASE WHEN true THEN 1 END; END;\n"
+        "SELECT f();"
+    )
+    assert len(_split(text)) == 2
+
+
+def test_split_meta_commands_and_trailing_statement():
+    assert _split("\\set x 1\nSELECT :x") == ["\\set x 1", "SELECT :x"]
+
+
+@pytest.mark.parametrize("statement", [
+    "SELECT 'a'",
+    "SELECT 'it''s'",
+    "SELECT E'a\\'b'",
+    "DO $body$ BEGIN PERFORM 1; END $body$",
+    "SELECT 1 /* a /* nested */ comment */",
+    "\\set x 'a",
+])
+def test_terminated_statements(statement):
+    assert not is_unterminated(statement)
+
+
+@pytest.mark.parametrize("statement", [
+    "SELECT 'oops",
+    "SELECT 'it''",
+    "SELECT \"col",
+    "DO $$ BEGIN",
+    "SELECT 1 /* a /* nested */",
+])
+def test_unterminated_statements(statement):
+    assert is_unterminated(statement)
@@ -0,0 +1,59 @@
+from sqlapply.config import DbConfig
+from sqlapply.models import LoadSample
+from sqlapply.throttle import Throttle
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def _throttle(samples: list[LoadSample | None], **settings) -> tuple[Throttle, list[LoadSample | None]]:
+    clock = FakeClock()
+    pending = list(samples)
+    db = DbConfig(dbname="db", throttle_poll=5, **settings)
+    return Throttle(db, probe=lambda db: pending.pop(0), sleep=clock.sleep, clock=clock), pending
+
+
+def test_disabled_without_limits():
+    throttle, pending = _throttle([LoadSample(replica_lag=100, active_backends=100)])
+    assert throttle.wait("script") == 0.0
+    assert len(pending) == 1
+
+
+def test_pauses_until_lag_drops():
+    throttle, pending = _throttle(
+        [LoadSample(30, 0), LoadSample(20, 0), LoadSample(5, 0)],
+        max_replica_lag=10,
+    )
+    assert throttle.wait("script") == 10.0
+    assert not pending
+
+
+def test_pauses_on_active_backends():
+    throttle, _ = _throttle([LoadSample(0, 80), LoadSample(0, 10)], max_active_backends=50)
+    assert throttle.wait("script") == 5.0
+
+
+def test_unavailable_load_disables_throttle():
+    throttle, _ = _throttle([None], max_replica_lag=10)
+    assert throttle.wait("script") == 0.0
+    assert not throttle.enabled
+
+
+def test_hidden_lag_warns_once(caplog):
+    throttle, _ = _throttle([LoadSample(None, 0), LoadSample(None, 0)], max_replica_lag=10)
+    assert throttle.wait("script") == 0.0
+    assert throttle.wait("script") == 0.0
+    assert sum("pg_monitor" in record.message for record in caplog.records) == 1
+
+
+def test_stop_interrupts_pause():
+    throttle, _ = _throttle([LoadSample(30, 0)], max_replica_lag=10)
+    assert throttle.wait("script", should_stop=lambda: throttle.clock() >= 1) == 1.0
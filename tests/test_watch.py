@@ -0,0 +1,68 @@
+import pytest
+
+from sqlapply import watch
+from sqlapply.watch import MAX_DEBOUNCE_FACTOR, PollingWatcher, Watcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class ScriptedWatcher(Watcher):
+    def __init__(self, clock: FakeClock, events: dict[float, set[str]]):
+        super().__init__(None)
+        self.clock = clock
+        self.events = dict(events)
+
+    def _poll(self, timeout: float) -> set[str]:
+        due = [at for at in self.events if at <= self.clock.now + timeout]
+        if not due:
+            self.clock.now += timeout
+            return set()
+        at = min(due)
+        self.clock.now = max(self.clock.now, at)
+        return self.events.pop(at)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(watch.time, "monotonic", fake.monotonic)
+    return fake
+
+
+def test_wait_collects_changes_until_quiet(clock):
+    watcher = ScriptedWatcher(clock, {1.0: {"db1"}, 1.3: {"db2"}, 1.6: {"db1"}, 5.0: {"db3"}})
+    assert watcher.wait(debounce=0.5) == {"db1", "db2"}
+    assert clock.now == pytest.approx(2.1)
+
+
+def test_wait_gives_up_debouncing_a_constant_stream(clock):
+    watcher = ScriptedWatcher(clock, {0.1 * i: {f"db{i}"} for i in range(1, 200)})
+    changed = watcher.wait(debounce=0.5)
+    assert clock.now == pytest.approx(0.1 + 0.5 * MAX_DEBOUNCE_FACTOR)
+    assert len(changed) < 199
+
+
+def test_wait_returns_nothing_when_stopped(clock):
+    watcher = ScriptedWatcher(clock, {})
+    assert watcher.wait(debounce=0.5, should_stop=lambda: clock.now > 1) == set()
+
+
+def test_polling_watcher_reports_changed_sections(tmp_path):
+    (tmp_path / "db1").mkdir()
+    (tmp_path / "db2").mkdir()
+    (tmp_path / "db1" / "01.sql").write_text("SELECT 1;", encoding="utf-8")
+    watcher = PollingWatcher(tmp_path, interval=0)
+
+    (tmp_path / "db2" / "01.sql").write_text("SELECT 2;", encoding="utf-8")
+    (tmp_path / "db2" / ".01.sql.swp").write_text("", encoding="utf-8")
+    assert watcher._poll(0) == {"db2"}
+    (tmp_path / "db3").mkdir()
+    (tmp_path / "db1" / "01.sql").unlink()
+    assert watcher._poll(0) == {"db1", "db3"}
+    assert watcher._poll(0) == set()